@@ -0,0 +1 @@
+"""CharacterSelect 效能基準測試（不需 WebUI）"""
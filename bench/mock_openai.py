@@ -0,0 +1,165 @@
+"""
+本機的 OpenAI 相容 chat completions 替身伺服器，用來測試 AI 擴充提詞
+可模擬延遲、429（附 Retry-After）與 5xx，支援 stream: true（SSE），回覆內容由使用者輸入決定
+
+用法：
+python -m bench.mock_openai --port 8010 --latency 0.5 --rate-limit 0.2
+再把 custom_settings.json 的 base_url 設為 http://127.0.0.1:8010/v1/chat/completions
+"""
+import json
+import random
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def mock_reply(messages):
+    """依最後一則使用者訊息產生固定的回覆"""
+    text = ""
+    for message in messages:
+        if message.get("role") == "user":
+            text = message.get("content", "")
+    subject = text.split(";")[0].strip() or "subject"
+    return f"{subject},standing,looking at viewer,detailed background,soft lighting,"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_json(HTTPStatus.BAD_REQUEST, {"error": {"message": "invalid JSON"}})
+            return
+        if not self.path.rstrip("/").endswith("chat/completions"):
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": {"message": "not found"}})
+            return
+
+        with server.lock:
+            server.requests += 1
+            roll = server.rng.random()
+        if roll < server.rate_limit:
+            with server.lock:
+                server.rate_limited += 1
+            self.send_json(HTTPStatus.TOO_MANY_REQUESTS, {"error": {"message": "rate limited"}},
+                           {"Retry-After": str(server.retry_after)})
+            return
+        if roll < server.rate_limit + server.error_rate:
+            with server.lock:
+                server.failed += 1
+            self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"error": {"message": "unavailable"}})
+            return
+
+        time.sleep(server.latency * (0.5 + server.rng.random()))
+        content = mock_reply(payload.get("messages", []))
+        if payload.get("stream"):
+            self.send_stream(content, payload.get("model", "mock"))
+            return
+        self.send_json(HTTPStatus.OK, {
+            "id": f"mock-{server.requests}",
+            "object": "chat.completion",
+            "model": payload.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        })
+
+    def send_stream(self, content, model):
+        """以 chunked 傳輸逐段送出 SSE，每段為一個逗號分隔的關鍵字"""
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = [piece + "," for piece in content.split(",") if piece]
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(self.server.chunk_delay)
+            event = {"object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            self.write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_json(self, status, obj, headers=None):
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(host="127.0.0.1", port=8010, latency=0.0, rate_limit=0.0, error_rate=0.0,
+                retry_after=1, seed=None, verbose=False, chunk_delay=0.05):
+    """
+    建立替身伺服器（尚未啟動）
+    Parameters:
+    latency (float): 平均回應延遲秒數（實際為 0.5～1.5 倍）
+    rate_limit (float): 回傳 429 的機率
+    error_rate (float): 回傳 503 的機率
+    retry_after (int): 429 回應的 Retry-After 秒數
+    chunk_delay (float): 串流模式下每段之間的間隔秒數
+    """
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.rate_limit = rate_limit
+    server.error_rate = error_rate
+    server.retry_after = retry_after
+    server.chunk_delay = chunk_delay
+    server.rng = random.Random(seed)
+    server.verbose = verbose
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.rate_limited = 0
+    server.failed = 0
+    return server
+
+
+def start_background(**kwargs):
+    """在背景執行緒啟動替身伺服器，回傳 (server, chat completions 網址)；以 server.shutdown() 停止"""
+    kwargs.setdefault("port", 0)
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1/chat/completions"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OpenAI 相容替身伺服器")
+    parser.add_argument("--host", default="127.0.0.1", help="監聽位址")
+    parser.add_argument("--port", type=int, default=8010, help="連接埠")
+    parser.add_argument("--latency", type=float, default=0.0, help="平均回應延遲秒數")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="回傳 429 的機率")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回傳 503 的機率")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 的 Retry-After 秒數")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="串流模式下每段之間的間隔秒數")
+    parser.add_argument("--seed", type=int, default=None, help="亂數種子")
+    parser.add_argument("--verbose", action="store_true", help="輸出每個請求的記錄")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.rate_limit, args.error_rate,
+                         args.retry_after, args.seed, args.verbose, args.chunk_delay)
+    print(f"替身伺服器: http://{args.host}:{args.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"共 {server.requests} 個請求，429: {server.rate_limited}，503: {server.failed}")
@@ -0,0 +1,255 @@
+"""
+CharacterSelect 效能基準測試
+在合成目錄（預設 2k / 20k / 200k 筆）上量測分片載入、排序、選擇人物、預覽圖解碼、
+細節提詞與隨機挑選，結果輸出為固定格式的 JSON，方便不同版本之間比較
+
+用法：
+python -m bench.run_bench --sizes 2000,20000 --output bench_results.json
+python -m bench.run_bench --compare old.json new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench import stubs
+
+SCHEMA = "charselect-bench/1"
+DEFAULT_SIZES = (2000, 20000, 200000)
+
+
+def measure(fn, repeat=5, number=1):
+    """執行 fn number 次為一輪，共 repeat 輪，回傳每次呼叫的毫秒數統計"""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t0) * 1000 / number)
+    return summarize(samples, repeat, number)
+
+
+def summarize(samples, repeat, number=1):
+    """毫秒數樣本的統計，格式與 measure 相同"""
+    return {
+        "repeat": repeat,
+        "number": number,
+        "min_ms": round(min(samples), 6),
+        "median_ms": round(statistics.median(samples), 6),
+        "mean_ms": round(statistics.fmean(samples), 6),
+        "stdev_ms": round(statistics.stdev(samples), 6) if len(samples) > 1 else 0.0,
+    }
+
+
+def legacy_load_shards(module, basedir):
+    """原本 __init__ 的作法：讀入全部分片的 dict"""
+    items = []
+    for i in range(10):
+        with open(os.path.join(basedir, f"output_{i+1}.json"), "r", encoding="utf-8") as f:
+            items.extend(json.load(f))
+    return items
+
+
+def legacy_sort(items):
+    """原本 __init__ 的排序與 hm_config_1_component 建立"""
+    component = {"random": ""}
+    for item in sorted(items, key=lambda x: list(x.keys())[0]):
+        key = list(item.keys())[0]
+        component.update({key: key})
+    return component
+
+
+def legacy_lookup(items, selection):
+    """原本 hm1_setting 的線性搜尋"""
+    value, index, i = None, 0, 0
+    for item in items:
+        i += 1
+        if item.get(selection, '') != '':
+            value = item.get(selection)
+            index = i
+    return value, index
+
+
+def run_size(module, size, workdir, repeat, include_legacy):
+    from charselect.catalog import CharacterCatalog
+    from charselect.previews import JsonPreviewStore, PackPreviewStore, open_preview_store, shard_paths
+    from charselect.snapshot import open_catalogs
+    from bench.synthetic import make_catalog
+
+    basedir = os.path.join(workdir, f"catalog_{size}")
+    names = make_catalog(basedir, size)
+    module.CharacterSelect.BASEDIR = basedir
+    open_preview_store(basedir)  # 先產生 previews.pack
+    rng = random.Random(size)
+    picks = [rng.choice(names) for _ in range(256)]
+    slow_repeat = max(1, min(repeat, 3 if size >= 100000 else repeat))
+    results = []
+
+    def add(name, stats):
+        results.append(dict({"benchmark": name, "size": size}, **stats))
+        print(f"  {name:<28} {stats['median_ms']:>12.4f} ms")
+
+    print(f"[{size}]")
+    if include_legacy:
+        items = legacy_load_shards(module, basedir)
+        add("legacy.load_shards", measure(lambda: legacy_load_shards(module, basedir), slow_repeat))
+        add("legacy.sort", measure(lambda: legacy_sort(items), slow_repeat))
+        it = iter(picks * 1000)
+        add("legacy.hm1_lookup", measure(lambda: legacy_lookup(items, next(it)), slow_repeat, 5))
+        del items
+
+    add("preview_index.json", measure(lambda: JsonPreviewStore(shard_paths(basedir)), slow_repeat))
+    pack_path = os.path.join(basedir, "previews.pack")
+    add("preview_index.pack", measure(lambda: PackPreviewStore(pack_path).close(), repeat))
+
+    store = PackPreviewStore(pack_path)
+    localizations = json.load(open(os.path.join(basedir, "zh_TW.json"), encoding="utf-8"))
+    add("catalog.build", measure(lambda: CharacterCatalog({"random": ""}, store.names(), localizations), slow_repeat))
+    store.close()
+
+    def snapshot_load():
+        _, _, snapshot_store = open_catalogs(basedir)
+        snapshot_store.close()
+
+    snapshot_load()  # 先產生 catalog.snapshot
+    add("catalog.snapshot", measure(snapshot_load, repeat))
+
+    #init：建構後 WebUI 即可繼續（目錄在背景載入）；init.ready：到目錄載入完成為止
+    #目錄每個行程只載入一次（兩個實例共用），每次量測前清掉才會重新載入
+    def fresh_instance():
+        module.CharacterSelect.shared_catalogs.clear()
+        return module.CharacterSelect()
+
+    samples = []
+    for _ in range(slow_repeat):
+        t0 = time.perf_counter()
+        instance = fresh_instance()
+        samples.append((time.perf_counter() - t0) * 1000)
+        instance.wait_catalogs()
+    add("init", summarize(samples, slow_repeat))
+    add("init.ready", measure(lambda: fresh_instance().wait_catalogs(), slow_repeat))
+    cs = module.CharacterSelect()
+    cs.wait_catalogs()
+    cs.prompt_component = stubs.Component(value="")
+
+    loop = asyncio.new_event_loop()
+
+    def hm1_cold():
+        cs.preview_cache.cache.clear()
+        loop.run_until_complete(cs.hm1_setting(next(it), "1girl, solo,"))
+
+    it = iter(picks * 1000)
+    add("hm1_setting.cold", measure(hm1_cold, repeat, 50))
+    it = iter(picks[:8] * 10 ** 5)
+    add("hm1_setting.warm", measure(lambda: loop.run_until_complete(cs.hm1_setting(next(it), "1girl, solo,")), repeat, 200))
+
+    async def loop_lag():
+        """同時 32 個冷快取的 hm1_setting 期間，事件迴圈最久多久無法回應"""
+        cs.preview_cache.cache.clear()
+        done = False
+        worst = 0.0
+
+        async def probe():
+            nonlocal worst
+            while not done:
+                t0 = time.perf_counter()
+                await asyncio.sleep(0)
+                worst = max(worst, time.perf_counter() - t0)
+
+        task = asyncio.ensure_future(probe())
+        await asyncio.gather(*(cs.hm1_setting(name, "1girl, solo,") for name in picks[:32]))
+        done = True
+        await task
+        return worst * 1000
+
+    add("event_loop.max_lag", summarize([loop.run_until_complete(loop_lag()) for _ in range(repeat)], repeat))
+    loop.close()
+
+    it = iter(range(10 ** 9))
+    add("hm1_setting2", measure(lambda: cs.hm1_setting2(next(it) % size, ""), repeat, 200))
+
+    data_url = cs.preview_store.get(picks[0])
+    try:
+        import PIL  # noqa: F401
+        add("base64_to_pil", measure(lambda: cs.base64_to_pil(data_url).load(), repeat, 20))
+    except ImportError:
+        print("  base64_to_pil                略過（未安裝 Pillow）")
+
+    prompt = "1girl, solo, " + names[0] + "," + cs.settings["quality"]
+    flags = [(True, False, False, True, False), (False, True, False, True, True), (True, True, False, False, True)]
+    it = iter(flags * 10 ** 6)
+    add("func_setting", measure(lambda: cs.func_setting(prompt, *next(it)), repeat, 200))
+    add("random.character", measure(cs.h_m_random_C_prompt, repeat, 200))
+    add("random.action", measure(cs.h_m_random_A_prompt, repeat, 200))
+    add("random.all", measure(cs.h_m_random_prompt, repeat, 200))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=stubs.ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    """比較兩份結果，列出各項的中位數與倍率"""
+    with open(old_path, encoding="utf-8") as f:
+        old = {(r["benchmark"], r["size"]): r for r in json.load(f)["results"]}
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)["results"]
+    print(f"{'benchmark':<28} {'size':>8} {'old ms':>12} {'new ms':>12} {'ratio':>8}")
+    for r in new:
+        before = old.get((r["benchmark"], r["size"]))
+        if before is None:
+            continue
+        ratio = r["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        print(f"{r['benchmark']:<28} {r['size']:>8} {before['median_ms']:>12.4f} {r['median_ms']:>12.4f} {ratio:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CharacterSelect 效能基準測試")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="合成目錄大小，以逗號分隔")
+    parser.add_argument("--repeat", type=int, default=5, help="每項量測輪數")
+    parser.add_argument("--output", default="bench_results.json", help="結果 JSON 路徑")
+    parser.add_argument("--workdir", default=None, help="合成目錄存放位置（預設為暫存資料夾）")
+    parser.add_argument("--no-legacy", action="store_true", help="不量測原本作法的對照組")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="比較兩份結果後結束")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    module = stubs.load_script()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        for size in sizes:
+            results += run_size(module, size, workdir, args.repeat, not args.no_legacy)
+
+    report = {
+        "schema": SCHEMA,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sizes": sizes,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"結果已寫入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
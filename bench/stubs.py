@@ -0,0 +1,97 @@
+"""WebUI 的 modules.* 與 gradio 替身，讓 scripts/character_select.py 可以在 WebUI 外匯入"""
+import importlib.util
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_PATH = os.path.join(ROOT, "scripts", "character_select.py")
+
+
+class Component:
+    """gradio 元件替身：記錄建構參數與 value"""
+
+    def __init__(self, *args, **kwargs):
+        self.kwargs = kwargs
+        self.value = kwargs.get("value")
+        self.label = kwargs.get("label")
+        self.elem_id = kwargs.get("elem_id")
+
+    def render(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _event(self, *args, **kwargs):
+        return None
+
+    click = change = release = select = input = focus = blur = submit = _event
+
+
+def _make_gradio():
+    gr = types.ModuleType("gradio")
+    for name in ("Button", "Dropdown", "Slider", "Image", "Checkbox", "Textbox", "Row", "Column",
+                 "Accordion", "State", "HTML", "Markdown"):
+        setattr(gr, name, type(name, (Component,), {}))
+    gr.update = lambda **kwargs: dict(kwargs, __type__="update")
+    gr.Error = type("Error", (Exception,), {})
+    gr.__stub__ = True
+    return gr
+
+
+def _make_modules(basedir):
+    modules = types.ModuleType("modules")
+    modules.__path__ = []
+
+    scripts = types.ModuleType("modules.scripts")
+
+    class Script:
+        is_txt2img = True
+        is_img2img = False
+
+    scripts.Script = Script
+    scripts.basedir = lambda: basedir
+
+    shared = types.ModuleType("modules.shared")
+    shared.state = types.SimpleNamespace(interrupt=lambda: None, need_restart=False)
+
+    ui = types.ModuleType("modules.ui")
+    ui.gr_show = lambda visible=True: {"visible": visible, "__type__": "update"}
+
+    sd_samplers = types.ModuleType("modules.sd_samplers")
+
+    modules.scripts = scripts
+    modules.shared = shared
+    modules.ui = ui
+    modules.sd_samplers = sd_samplers
+    return {
+        "modules": modules,
+        "modules.scripts": scripts,
+        "modules.shared": shared,
+        "modules.ui": ui,
+        "modules.sd_samplers": sd_samplers,
+    }
+
+
+def install(basedir=ROOT, force_gradio=False):
+    """
+    安裝替身模組；已安裝真正的 gradio 時預設沿用（force_gradio=True 則一律使用替身）
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    sys.modules.update(_make_modules(basedir))
+    if force_gradio or importlib.util.find_spec("gradio") is None:
+        sys.modules["gradio"] = _make_gradio()
+
+
+def load_script(basedir=ROOT):
+    """安裝替身後匯入 scripts/character_select.py，回傳模組"""
+    install(basedir)
+    spec = importlib.util.spec_from_file_location("character_select", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
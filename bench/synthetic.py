@@ -0,0 +1,58 @@
+"""產生指定大小的合成人物目錄（output_N.json、zh_TW.json、custom_*.json）"""
+import base64
+import io
+import json
+import os
+import random
+import shutil
+
+from charselect.previews import NUM_PARTS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample_image(width=104, height=152):
+    """
+    產生一張小 WebP；沒有 Pillow 時改用只有檔頭的假資料
+    預設為實際預覽圖的一半寬高，200k 筆時分片總量仍在可接受範圍
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return b"RIFF\x00\x00\x00\x00WEBPVP8 " + bytes(64)
+    image = Image.new("RGB", (width, height))
+    image.putdata([(x * 2 % 256, y * 2 % 256, (x * y) % 256) for y in range(height) for x in range(width)])
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=60)
+    return buffer.getvalue()
+
+
+def character_name(i):
+    series = f"series_{i % 397}"
+    return f"{series}_(series), character {i}, {series} (series)"
+
+
+def make_catalog(path, size, seed=0):
+    """
+    在 path 建立含 size 個人物的合成目錄，回傳人物名稱列表
+    名稱刻意打亂順序寫入分片，讓排序有實際成本
+    """
+    os.makedirs(path, exist_ok=True)
+    rng = random.Random(seed)
+    names = [character_name(i) for i in range(size)]
+    shuffled = names[:]
+    rng.shuffle(shuffled)
+
+    data_url = "data:image/webp;base64," + base64.b64encode(sample_image()).decode("ascii")
+    per_part = (size + NUM_PARTS - 1) // NUM_PARTS
+    for part in range(NUM_PARTS):
+        chunk = shuffled[part * per_part:(part + 1) * per_part]
+        with open(os.path.join(path, f"output_{part + 1}.json"), "w", encoding="utf-8") as f:
+            json.dump([{name: data_url} for name in chunk], f, indent=2)
+
+    with open(os.path.join(path, "zh_TW.json"), "w", encoding="utf-8") as f:
+        json.dump({f"角色{i} (作品{i % 397})": name for i, name in enumerate(names)}, f, ensure_ascii=False, indent=2)
+    for filename in ("settings.json", "action.json", "character.json"):
+        shutil.copy2(os.path.join(ROOT, filename), os.path.join(path, filename))
+        shutil.copy2(os.path.join(ROOT, filename), os.path.join(path, "custom_" + filename))
+    return names
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+静态网站构建
+把 output_*.json 和 zh_*.json 转换成 GitHub Pages 使用的静态文件：
+  previews/<内容哈希>.webp   单张预览图（相同图片只保存一份）
+  data/catalog.json          角色列表与 提示词 → 预览图文件 对照表
+  data/search.json           预先建好的搜索索引（短前缀表 + 规范化文本）
+并为文本文件生成 .gz / .br 预压缩文件
+
+用法：
+python build_site.py --output _site
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+from charselect.catalog import CharacterCatalog
+from charselect.previews import JsonPreviewStore, guess_mime, shard_paths
+from charselect.search import build_character_index
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 随网页一起发布的静态文件
+STATIC_FILES = ['index.html', 'web']
+EXTENSIONS = {'image/webp': '.webp', 'image/jpeg': '.jpg', 'image/png': '.png', 'image/avif': '.avif'}
+COMPRESSIBLE = ('.html', '.js', '.css', '.json', '.svg')
+# 前缀表每个前缀保留的结果数
+PREFIX_TOP_K = 20
+
+
+def load_json(path, default=None):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def write_json(path, obj):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def write_previews(root, output):
+    """写出内容哈希命名的预览图，返回 提示词 → 文件名"""
+    os.makedirs(os.path.join(output, 'previews'), exist_ok=True)
+    previews = {}
+    written = 0
+    for name, data in JsonPreviewStore(shard_paths(root)).items():
+        filename = hashlib.sha256(data).hexdigest()[:16] + EXTENSIONS.get(guess_mime(data), '.bin')
+        path = os.path.join(output, 'previews', filename)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(data)
+            written += 1
+        previews[name] = filename
+    return previews, written
+
+
+def build_data(root, output, previews):
+    """写出角色列表与搜索索引"""
+    zh_tw = load_json(os.path.join(root, 'zh_TW.json'), {})
+    zh_cn = load_json(os.path.join(root, 'zh_CN.json'), {})
+    tw_names = {prompt: name for name, prompt in zh_tw.items()}
+    cn_names = {prompt: name for name, prompt in zh_cn.items()}
+    prompts = list(dict.fromkeys(list(zh_tw.values()) + list(zh_cn.values())))
+
+    # 目录的位置即 entries 的下标
+    catalog = CharacterCatalog({}, prompts, zh_tw)
+    index = build_character_index(catalog, [zh_cn])
+
+    os.makedirs(os.path.join(output, 'data'), exist_ok=True)
+    write_json(os.path.join(output, 'data', 'catalog.json'), {
+        'version': 1,
+        # [提示词, 繁体名称, 简体名称]
+        'entries': [[prompt, tw_names.get(prompt, ''), cn_names.get(prompt, '')] for prompt in prompts],
+        'previews': {prompt: previews[prompt] for prompt in prompts if prompt in previews},
+    })
+    write_json(os.path.join(output, 'data', 'search.json'), {
+        'version': 1,
+        'prefixLength': index.PREFIX_LEN,
+        'prefixes': {prefix: [doc for doc, _ in ranked[:PREFIX_TOP_K]] for prefix, ranked in index.prefixes.items()},
+        'texts': ['\n'.join(text for text, _ in fields) for fields in index.fields],
+    })
+    return len(prompts)
+
+
+def copy_static(root, output):
+    for name in STATIC_FILES:
+        src = os.path.join(root, name)
+        dst = os.path.join(output, name)
+        if os.path.isdir(src):
+            shutil.copytree(src, dst, dirs_exist_ok=True)
+        elif os.path.exists(src):
+            shutil.copy2(src, dst)
+
+
+def compress_assets(output):
+    """为文本文件生成 .gz（以及安装了 brotli 时的 .br）"""
+    count = 0
+    for dirpath, _, filenames in os.walk(output):
+        for filename in filenames:
+            if not filename.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as f:
+                data = f.read()
+            with open(path + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(path + '.br', 'wb') as f:
+                    f.write(brotli.compress(data))
+            count += 1
+    return count
+
+
+def build_site(root, output, compress=True):
+    os.makedirs(output, exist_ok=True)
+    copy_static(root, output)
+    previews, written = write_previews(root, output)
+    print(f"🖼️  预览图: {len(previews)} 个角色，{len(set(previews.values()))} 张不重复图片（本次写入 {written} 张）")
+    count = build_data(root, output, previews)
+    print(f"📇 角色列表与搜索索引: {count} 个角色")
+    if compress:
+        compressed = compress_assets(output)
+        print(f"🗜️  已为 {compressed} 个文本文件生成 .gz{' / .br' if brotli else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='构建静态网站')
+    parser.add_argument('--root', default=ROOT, help='数据与网页所在目录')
+    parser.add_argument('--output', default=os.path.join(ROOT, '_site'), help='输出目录')
+    parser.add_argument('--no-compress', action='store_true', help='不生成 .gz / .br')
+    args = parser.parse_args()
+
+    print('🚀 开始构建静态网站...')
+    build_site(args.root, args.output, compress=not args.no_compress)
+    print(f'✅ 构建完成: {args.output}')
+
+
+if __name__ == '__main__':
+    main()
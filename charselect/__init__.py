@@ -0,0 +1 @@
+"""CharacterSelect 的共用模組，不依賴 WebUI，可供獨立工具使用"""
@@ -0,0 +1,233 @@
+"""
+AI 擴充提詞的回覆快取：以 sqlite 保存在硬碟上，依 (base_url, 模型, 系統提示雜湊, 輸入) 查詢，
+有存活時間與筆數上限（最久未使用的先刪），相同的請求同時進行時只實際送出一次
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from charselect.aiclient import AIRequestError
+
+CACHE_FILE = "ai_cache.sqlite3"
+
+
+def cache_key(base_url, model, system_prompt, input_prompt):
+    system_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    raw = json.dumps([base_url, model, system_hash, input_prompt], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """同一個 key 同時只執行一次，其他呼叫者等待並共用結果（或例外）"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+
+class StreamAborted(Exception):
+    """共用的串流在完成前中斷（帶頭的呼叫者停止讀取）"""
+
+
+class SharedStream:
+    """
+    同一個 key 同時進行的串流：帶頭的呼叫者實際讀取並逐段寫入，
+    其他呼叫者從頭依序讀到相同的片段（或相同的例外）
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def append(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self, timeout=None):
+        """
+        依序產生片段直到串流結束
+        超過 timeout 秒沒有新片段（帶頭的呼叫者卡住或消失）時丟出 AIRequestError
+        """
+        position = 0
+        while True:
+            with self._cond:
+                while position >= len(self.chunks) and not self.done:
+                    if not self._cond.wait(timeout):
+                        raise AIRequestError(f"共用的串流超過 {timeout} 秒沒有新內容")
+                chunks = self.chunks[position:]
+                done, error = self.done, self.error
+            yield from chunks
+            position += len(chunks)
+            if done and position >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class ResponseCache:
+    """
+    sqlite 回覆快取（執行緒安全）
+    Parameters:
+    path (str): 資料庫路徑，":memory:" 為不落地
+    ttl (float): 存活秒數，0 表示不過期
+    max_entries (int): 最多保存的筆數
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=1000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.flight = SingleFlight()
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, key, record=True):
+        """未命中或已過期時回傳 None；record 為 False 時不計入命中率"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                self.misses += record
+                return None
+            self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+            self.hits += record
+            return row[0]
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._prune(now)
+
+    def _prune(self, now):
+        if self.ttl:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (max(0, self.max_entries),)
+        )
+
+    def fetch(self, key, compute):
+        """
+        先查快取，未命中時呼叫 compute() 取得回覆並保存（空回覆不保存）
+        相同 key 同時未命中時只會呼叫一次 compute
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        def load():
+            #等待期間可能已由其他呼叫寫入
+            value = self.get(key, record=False)
+            if value is None:
+                value = compute()
+                if value:
+                    self.put(key, value)
+            return value
+
+        return self.flight.do(key, load)
+
+    def fetch_stream(self, key, open_stream, timeout=None):
+        """
+        fetch 的串流版本：逐段產生回覆
+        命中時整段產生一次；未命中時只有第一個呼叫者以 open_stream() 開啟串流，
+        相同 key 同時未命中的呼叫者共用它的片段，完整收到的回覆寫入快取
+        timeout 為共用者等待下一個片段的秒數上限（通常為用戶端的讀取逾時）
+        """
+        value = self.get(key)
+        if value is not None:
+            yield value
+            return
+        with self._lock:
+            shared = self._streams.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._streams[key] = SharedStream()
+        if not leader:
+            yield from shared.follow(timeout)
+            return
+
+        error = StreamAborted("串流在完成前中斷")
+        try:
+            #等待期間可能已由其他呼叫寫入
+            value = self.get(key, record=False)
+            if value is not None:
+                shared.append(value)
+                yield value
+            else:
+                for chunk in open_stream():
+                    shared.append(chunk)
+                    yield chunk
+                if shared.chunks:
+                    self.put(key, "".join(shared.chunks))
+            error = None
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            with self._lock:
+                del self._streams[key]
+            shared.finish(error)
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,265 @@
+"""
+AI 擴充提詞用的 HTTP 用戶端：共用連線池（keep-alive）、連線與讀取逾時、
+429 / 5xx 時有上限的重試（隨機退避並遵守 Retry-After），以及每次呼叫的延遲統計
+"""
+import email.utils
+import json
+import random
+import textwrap
+import threading
+import time
+from collections import deque
+
+PRIME_DIRECTIVE = textwrap.dedent("""\
+    Act as a prompt maker with the following guidelines:
+    - Break keywords by commas.
+    - Provide high-quality, non-verbose, coherent, brief, concise, and not superfluous prompts.
+    - Focus solely on the visual elements of the picture; avoid art commentaries or intentions.
+    - Construct the prompt with the component format:
+    1. Start with the subject and keyword description.
+    2. Follow with motion keyword description.
+    3. Follow with scene keyword description.
+    4. Finish with background and keyword description.
+    - Limit yourself to no more than 20 keywords per component
+    - Include all the keywords from the user's request verbatim as the main subject of the response.
+    - Be varied and creative.
+    - Always reply on the same line and no more than 100 words long.
+    - Do not enumerate or enunciate components.
+    - Create creative additional information in the response.
+    - Response in English.
+    - Response prompt only.
+    The followin is an illustartive example for you to see how to construct a prompt your prompts should follow this format but always coherent to the subject worldbuilding or setting and cosider the elemnts relationship.
+    Example:
+    Demon Hunter,Cyber City,A Demon Hunter,standing,lone figure,glow eyes,deep purple light,cybernetic exoskeleton,sleek,metallic,glowing blue accents,energy weapons,Fighting Demon,grotesque creature,twisted metal,glowing red eyes,sharp claws,towering structures,shrouded haze,shimmering energy,
+    Make a prompt for the following Subject:
+    """)
+
+#會重試的狀態碼
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+def expansion_messages(input_prompt, system_prompt=PRIME_DIRECTIVE):
+    """AI 擴充提詞的對話內容"""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": input_prompt + ";Response in English"}
+    ]
+
+
+def parse_retry_after(value, now=None):
+    """Retry-After 標頭（秒數或 HTTP 日期）轉為等待秒數，無法解析時回傳 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when - (time.time() if now is None else now))
+
+
+class AIRequestError(Exception):
+    """重試後仍然失敗的請求；status 為最後一次的狀態碼，連線錯誤時為 None"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class LatencyStats:
+    """每次呼叫的延遲（含重試）統計，百分位數取最近 window 筆（執行緒安全）"""
+
+    def __init__(self, window=256):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total = 0.0
+        self.last = None
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, retries=0, error=False):
+        with self._lock:
+            self.calls += 1
+            self.retries += retries
+            self.errors += bool(error)
+            self.total += seconds
+            self.last = seconds
+            self._recent.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            calls, errors, retries, total, last = self.calls, self.errors, self.retries, self.total, self.last
+
+        def percentile(p):
+            return recent[min(len(recent) - 1, int(p * len(recent)))] if recent else None
+
+        return {
+            "calls": calls,
+            "errors": errors,
+            "retries": retries,
+            "mean": total / calls if calls else None,
+            "last": last,
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "max": recent[-1] if recent else None,
+        }
+
+
+class AIClient:
+    """
+    OpenAI 相容 chat completions 用戶端，多個執行緒可共用同一個實例
+    Parameters:
+    base_url (str): 完整的 chat completions 網址
+    api_key (str): Bearer token，空字串時不送 Authorization
+    model (str): 模型名稱
+    connect_timeout (float): 建立連線的逾時秒數
+    read_timeout (float): 等待回應的逾時秒數
+    retries (int): 429 / 5xx / 連線失敗時最多重試次數
+    backoff (float): 第一次重試的退避上限秒數，之後每次加倍
+    max_backoff (float): 單次等待的上限秒數（也限制 Retry-After）
+    pool_size (int): 連線池大小
+    """
+
+    def __init__(self, base_url, api_key="", model="", connect_timeout=5.0, read_timeout=60.0,
+                 retries=3, backoff=0.5, max_backoff=20.0, pool_size=4):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = LatencyStats()
+        #串流模式下收到第一段內容的時間
+        self.first_chunk = LatencyStats()
+        #requests 在第一次建立用戶端時才匯入，不拖慢 WebUI 啟動
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def from_settings(cls, settings, **kwargs):
+        """以 custom_settings.json 的設定建立，kwargs 可覆寫其他參數（例如 pool_size）"""
+        kwargs.setdefault("connect_timeout", settings.get("ai_connect_timeout", 5))
+        kwargs.setdefault("read_timeout", settings.get("ai_read_timeout", 60))
+        kwargs.setdefault("retries", settings.get("ai_retries", 3))
+        return cls(settings["base_url"], settings.get("api_key", ""), settings.get("model", ""), **kwargs)
+
+    def headers(self):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = "Bearer " + self.api_key
+        return headers
+
+    def retry_delay(self, attempt, retry_after=None):
+        """第 attempt 次重試前的等待秒數：有 Retry-After 時照辦，否則為 full jitter 指數退避"""
+        if retry_after is not None:
+            return min(self.max_backoff, retry_after) + random.uniform(0, self.backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def post(self, payload, headers=None, stream=False):
+        """
+        送出請求，必要時重試
+        Returns:
+        requests.Response: 狀態碼 200 的回應
+        Raises:
+        AIRequestError: 重試後仍然失敗
+        """
+        import requests
+
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            status = None
+            retry_after = None
+            try:
+                response = self.session.post(self.base_url, headers=headers or self.headers(),
+                                             json=payload, timeout=self.timeout, stream=stream)
+                status = response.status_code
+                if status == 200:
+                    self.stats.record(time.perf_counter() - start, attempt)
+                    return response
+                message = f"Request failed with status code {status}"
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.close()
+                retryable = status in RETRY_STATUSES
+            except requests.exceptions.ReadTimeout as e:
+                #伺服器已收到請求卻沒有回應，重試只會再卡一次
+                message = f"Request timed out: {e}"
+                retryable = False
+            except requests.exceptions.ConnectionError as e:
+                message = f"Connection failed: {e}"
+                retryable = True
+            if not retryable or attempt >= self.retries:
+                self.stats.record(time.perf_counter() - start, attempt, error=True)
+                raise AIRequestError(message, status)
+            time.sleep(self.retry_delay(attempt, retry_after))
+            attempt += 1
+
+    def complete(self, messages, headers=None, **params):
+        """送出對話並回傳回覆內容"""
+        payload = {"model": self.model, "messages": messages}
+        payload.update(params)
+        response = self.post(payload, headers)
+        try:
+            return (response.json().get('choices') or [{}])[0].get('message', {}).get('content', '')
+        except ValueError as e:
+            raise AIRequestError(f"Invalid JSON response: {e}", response.status_code)
+
+    def stream(self, messages, headers=None, **params):
+        """
+        以 SSE（stream: true）送出對話，逐段產生回覆內容
+        伺服器不支援串流而直接回傳完整 JSON 時，整段內容一次產生
+        Raises:
+        AIRequestError: 請求失敗或串流中斷
+        """
+        import requests
+
+        payload = {"model": self.model, "messages": messages, "stream": True}
+        payload.update(params)
+        start = time.perf_counter()
+        response = self.post(payload, headers, stream=True)
+        first = True
+        try:
+            if response.headers.get("Content-Type", "").startswith("application/json"):
+                chunks = [(response.json().get('choices') or [{}])[0].get('message', {}).get('content', '')]
+            else:
+                chunks = self._sse_chunks(response)
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if first:
+                    self.first_chunk.record(time.perf_counter() - start)
+                    first = False
+                yield chunk
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise AIRequestError(f"Stream interrupted: {e}", response.status_code)
+        finally:
+            response.close()
+
+    @staticmethod
+    def _sse_chunks(response):
+        for line in response.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                return
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            choices = event.get("choices") or [{}]
+            yield (choices[0].get("delta") or {}).get("content")
+
+    def close(self):
+        self.session.close()
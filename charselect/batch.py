@@ -0,0 +1,195 @@
+"""
+大量產生隨機提詞：人物 × 動作，可重現的亂數種子，支援取後放回與不放回抽樣
+逐筆產生並直接寫出，記憶體用量與產生數量無關
+
+用法：
+python -m charselect.batch -n 100000 --seed 42 --unique --features quality nsfw --output prompts.jsonl
+"""
+import csv
+import json
+import os
+import random
+import sys
+
+from charselect.catalog import ActionCatalog, CharacterCatalog
+from charselect.previews import open_preview_store
+from charselect.prompt import PromptComposer
+
+#custom_settings.json 中可加入的細節提詞，順序與介面上的勾選框相同
+FEATURES = ("nsfw", "more_detail", "less_detail", "quality", "character_enhance")
+FIELDS = ("index", "character", "action", "prompt")
+
+_MASK64 = (1 << 64) - 1
+
+
+class FeistelPermutation:
+    """
+    [0, size) 的虛擬隨機排列，不需保存整個序列
+    以平衡 Feistel 網路打亂 2 的次方範圍，超出 size 的值再加密一次（cycle walking）直到落在範圍內
+    """
+
+    __slots__ = ("size", "half", "mask", "keys")
+
+    ROUNDS = 4
+
+    def __init__(self, size, seed):
+        if size < 1:
+            raise ValueError("size 必須大於 0")
+        bits = max(2, (size - 1).bit_length())
+        bits += bits & 1
+        self.size = size
+        self.half = bits // 2
+        self.mask = (1 << self.half) - 1
+        rng = random.Random(seed)
+        self.keys = tuple(rng.getrandbits(64) for _ in range(self.ROUNDS))
+
+    def _round(self, value, key):
+        x = ((value ^ key) * 0x9E3779B97F4A7C15) & _MASK64
+        x ^= x >> 29
+        x = (x * 0xBF58476D1CE4E5B9) & _MASK64
+        x ^= x >> 32
+        return x & self.mask
+
+    def _encrypt(self, value):
+        left, right = value >> self.half, value & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self.half) | right
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+
+def load_catalogs(basedir):
+    """
+    讀取插件使用的人物、動作目錄與設定
+    Returns:
+    tuple: (CharacterCatalog, ActionCatalog, settings dict)
+    """
+    def load(name, default):
+        try:
+            with open(os.path.join(basedir, name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    settings = load("custom_settings.json", None) or load("settings.json", {})
+    #只讀：有最新的 previews.pack 就用，否則直接掃描分片，不產生預覽包
+    store = open_preview_store(basedir, build=False)
+    characters = CharacterCatalog(load("custom_character.json", {}), store.names(), load("zh_TW.json", {}))
+    if hasattr(store, "close"):
+        store.close()
+    actions = ActionCatalog(load("custom_action.json", {}))
+    return characters, actions, settings
+
+
+def feature_prompt(settings, features):
+    """依指定的細節名稱組出細節提詞"""
+    unknown = [name for name in features if name not in FEATURES]
+    if unknown:
+        raise ValueError(f"未知的細節: {', '.join(unknown)}")
+    return "".join(settings.get(name, "") for name in FEATURES if name in features)
+
+
+def generate(characters, actions, count, seed, unique=False, features=""):
+    """
+    逐筆產生隨機提詞（略過兩個目錄第 0 筆的 random）
+    Parameters:
+    characters (ActionCatalog): 人物目錄
+    actions (ActionCatalog): 動作目錄，沒有動作時只抽人物
+    count (int): 產生數量
+    seed (int): 亂數種子，相同種子與目錄產生相同結果
+    unique (bool): True 時不放回抽樣，人物 × 動作組合不重複
+    features (str): 附加在每筆提詞後的細節提詞
+    Returns:
+    iterator: dict，欄位為 FIELDS
+    """
+    num_characters = len(characters) - 1
+    num_actions = len(actions) - 1
+    if num_characters < 1:
+        raise ValueError("人物目錄是空的")
+    combos = num_characters * max(num_actions, 1)
+    if unique and count > combos:
+        raise ValueError(f"不放回抽樣最多只能產生 {combos} 筆（人物 {num_characters} × 動作 {max(num_actions, 1)}）")
+
+    if unique:
+        order = FeistelPermutation(combos, seed)
+        draw = order.__getitem__
+    else:
+        rng = random.Random(seed)
+        draw = lambda i: rng.randrange(combos)
+    #參數錯誤在呼叫時就丟出，不等到開始讀取
+    return _rows(characters, actions, count, draw, features)
+
+
+def _rows(characters, actions, count, draw, features):
+    num_characters = len(characters) - 1
+    num_actions = len(actions) - 1
+    composer = PromptComposer()
+    composer.set("features", features)
+    for i in range(count):
+        combo = draw(i)
+        character = characters.names[combo % num_characters + 1]
+        composer.set("character", characters.prompts[combo % num_characters + 1])
+        action = ""
+        if num_actions > 0:
+            position = combo // num_characters + 1
+            action = actions.names[position]
+            composer.set("action", actions.prompts[position])
+        yield {"index": i, "character": character, "action": action, "prompt": composer.text()}
+
+
+def write_jsonl(rows, f):
+    count = 0
+    for row in rows:
+        f.write(json.dumps(row, ensure_ascii=False))
+        f.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(rows, f):
+    writer = csv.writer(f)
+    writer.writerow(FIELDS)
+    count = 0
+    for row in rows:
+        writer.writerow([row[field] for field in FIELDS])
+        count += 1
+    return count
+
+
+WRITERS = {"jsonl": write_jsonl, "csv": write_csv}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="大量產生隨機人物 × 動作提詞")
+    parser.add_argument("-n", "--count", type=int, required=True, help="產生數量")
+    parser.add_argument("--seed", type=int, default=None, help="亂數種子，未指定時隨機產生並顯示")
+    parser.add_argument("--unique", action="store_true", help="不放回抽樣，組合不重複")
+    parser.add_argument("--features", nargs="*", default=[], choices=FEATURES, help="附加的細節提詞")
+    parser.add_argument("--format", choices=sorted(WRITERS), default=None, help="輸出格式，預設依副檔名判斷")
+    parser.add_argument("--output", default="-", help="輸出路徑，- 為標準輸出")
+    parser.add_argument("--basedir", default=".", help="插件資料夾")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.SystemRandom().randrange(1 << 32)
+    fmt = args.format or ("csv" if args.output.endswith(".csv") else "jsonl")
+    characters, actions, settings = load_catalogs(args.basedir)
+    rows = generate(characters, actions, args.count, seed, args.unique, feature_prompt(settings, args.features))
+
+    if args.output == "-":
+        count = WRITERS[fmt](rows, sys.stdout)
+    else:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            count = WRITERS[fmt](rows, f)
+    print(f"成功：已產生 {count} 筆提詞（seed={seed}）", file=sys.stderr)
@@ -0,0 +1,124 @@
+"""預覽圖快取：解碼並縮小後的圖片，以筆數與位元組數限制的 LRU 保存"""
+import io
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    同時以筆數與位元組數限制容量的 LRU 快取（執行緒安全）
+    Parameters:
+    max_entries (int): 最多保存的筆數
+    max_bytes (int): 最多保存的位元組數，put 時由呼叫端提供每筆大小
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=0):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            # 單筆超過上限就不保存
+            if size > self.max_bytes or self.max_entries <= 0:
+                return
+            self._data[key] = (value, size)
+            self.bytes += size
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """回傳 hits / misses / evictions 等統計"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._data),
+                "bytes": self.bytes,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def decode_thumbnail(data, width):
+    """
+    解碼圖片並縮小到指定寬度
+    JPEG 可用 draft 在解碼時直接縮小；其他格式先以 reduce 做整數倍縮小，再精細縮放
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    if image.width > width:
+        height = max(1, image.height * width // image.width)
+        image.draft("RGB", (width, height))
+        factor = image.width // width
+        if factor >= 2:
+            image = image.reduce(factor)
+        if image.width > width:
+            resample = getattr(Image, "Resampling", Image).LANCZOS
+            image = image.resize((width, max(1, image.height * width // image.width)), resample)
+    image.load()
+    return image
+
+
+class PreviewCache:
+    """
+    預覽圖庫外層的快取，保存已縮小到顯示尺寸的 PIL Image
+    Parameters:
+    store: JsonPreviewStore 或 PackPreviewStore
+    width (int): 顯示寬度（像素）
+    max_entries (int): 最多快取張數
+    max_bytes (int): 快取上限（以解碼後像素資料估算）
+    """
+
+    def __init__(self, store, width=200, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.store = store
+        self.width = width
+        self.cache = LRUCache(max_entries, max_bytes)
+
+    def get(self, name):
+        """取得縮小後的預覽圖，找不到時回傳 None"""
+        image = self.cache.get(name)
+        if image is not None:
+            return image
+        data = self.store.get_bytes(name)
+        if data is None:
+            return None
+        image = decode_thumbnail(data, self.width)
+        self.cache.put(name, image, image.width * image.height * len(image.getbands()))
+        return image
+
+    def stats(self):
+        return self.cache.stats()
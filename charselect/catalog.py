@@ -0,0 +1,167 @@
+"""人物與動作目錄：以陣列保存，提供排序、位置存取、O(1) 隨機與中文名稱查詢"""
+import random
+import sys
+
+
+def deep_sizeof(*objs):
+    """估算 dict / list / tuple / str 組成的資料實際佔用的位元組數（共用物件只計一次）"""
+    seen = set()
+    total = 0
+    stack = list(objs)
+    while stack:
+        obj = stack.pop()
+        if obj is None or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return total
+
+
+class ActionCatalog:
+    """
+    動作目錄（action.json / custom_action.json）
+    names 與 prompts 為平行陣列，順序與檔案相同；第 0 筆通常為 "random"
+    """
+
+    __slots__ = ("names", "prompts", "positions")
+
+    def __init__(self, entries):
+        self.names = []
+        self.prompts = []
+        self.positions = {}
+        for name, prompt in entries.items():
+            name = sys.intern(name)
+            self.positions[name] = len(self.names)
+            self.names.append(name)
+            self.prompts.append(sys.intern(prompt))
+
+    def __getstate__(self):
+        # 只保存陣列，載入時再建立查詢表（比 pickle 還原 dict 快）
+        return self.names, self.prompts
+
+    def __setstate__(self, state):
+        self.names, self.prompts = state
+        self.positions = dict(zip(self.names, range(len(self.names))))
+
+    def _update_prompts(self, entries):
+        """名稱與順序都相同時就地更新提示詞，回傳變動的名稱；名稱或順序不同時回傳 None"""
+        if len(entries) != len(self.names) or any(a != b for a, b in zip(entries, self.names)):
+            return None
+        changed = []
+        for position, prompt in enumerate(entries.values()):
+            if self.prompts[position] != prompt:
+                self.prompts[position] = sys.intern(prompt)
+                changed.append(self.names[position])
+        return changed
+
+    def updated(self, entries):
+        """
+        套用重新載入的 {名稱: 提示詞}
+        只有提示詞變動時就地更新並回傳自己；有新增、刪除或順序變動時回傳新的目錄，
+        呼叫端替換參照即可，正在讀取舊目錄的處理函式不受影響
+        Returns:
+        tuple: (目錄, 是否有變動)
+        """
+        changed = self._update_prompts(entries)
+        if changed is None:
+            return type(self)(entries), True
+        return self, bool(changed)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def __getitem__(self, position):
+        return self.names[position]
+
+    def position(self, name, default=None):
+        return self.positions.get(name, default)
+
+    def prompt(self, name):
+        """名稱對應的提示詞，不存在時丟出 KeyError"""
+        return self.prompts[self.positions[name]]
+
+    def random_name(self, rng=random):
+        """隨機挑選一筆（略過第 0 筆 random）"""
+        if len(self.names) < 2:
+            return self.names[0] if self.names else ""
+        return self.names[rng.randint(1, len(self.names) - 1)]
+
+    def memory_footprint(self):
+        """回傳本目錄佔用的位元組數"""
+        return deep_sizeof(self.names, self.prompts, self.positions)
+
+
+class CharacterCatalog(ActionCatalog):
+    """
+    人物目錄：custom_character.json 的項目在前，其後為依名稱排序的預覽圖人物
+    另外保存中文名稱（zh_TW.json）的正反查詢
+    """
+
+    __slots__ = ("localized_names", "_from_localized", "_to_localized")
+
+    def __init__(self, custom, preview_names, localizations=None):
+        entries = dict(custom)
+        # 與原本相同：預覽圖人物的提示詞就是名稱本身
+        for name in preview_names:
+            entries[name] = name
+        super().__init__(entries)
+        self.localized_names = []
+        self._from_localized = {}
+        self._to_localized = {}
+        for zhname, prompt in (localizations or {}).items():
+            zhname = sys.intern(zhname)
+            prompt = sys.intern(prompt)
+            self.localized_names.append(zhname)
+            self._from_localized[zhname] = prompt
+            self._to_localized[prompt] = zhname
+
+    def __getstate__(self):
+        return self.names, self.prompts, self.localized_names, [self._from_localized[zhname] for zhname in self.localized_names]
+
+    def __setstate__(self, state):
+        super().__setstate__(state[:2])
+        self.localized_names, localized_prompts = state[2:]
+        self._from_localized = dict(zip(self.localized_names, localized_prompts))
+        self._to_localized = dict(zip(localized_prompts, self.localized_names))
+
+    def with_custom(self, custom, preview_names):
+        """
+        套用重新載入的 custom_character.json
+        預覽圖人物與中文名稱查詢沿用本目錄（不必重新掃描預覽圖或讀取 zh_TW.json）
+        Returns:
+        tuple: (目錄, 是否有變動)，規則同 ActionCatalog.updated
+        """
+        entries = dict(custom)
+        for name in preview_names:
+            entries[name] = name
+        changed = self._update_prompts(entries)
+        if changed is not None:
+            return self, bool(changed)
+        catalog = type(self)(custom, preview_names)
+        catalog.localized_names = self.localized_names
+        catalog._from_localized = self._from_localized
+        catalog._to_localized = self._to_localized
+        return catalog, True
+
+    def localized(self, name, default=None):
+        """人物名稱 → 中文名稱"""
+        return self._to_localized.get(name, default)
+
+    def from_localized(self, zhname, default=None):
+        """中文名稱 → 人物名稱"""
+        return self._from_localized.get(zhname, default)
+
+    def memory_footprint(self):
+        return deep_sizeof(self.names, self.prompts, self.positions,
+                           self.localized_names, self._from_localized, self._to_localized)
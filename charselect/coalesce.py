@@ -0,0 +1,50 @@
+"""事件合併：同一頻道的事件依序編號，只採用最新事件的結果"""
+import threading
+
+
+class LatestWins:
+    """
+    每個頻道的事件在開始時取得遞增序號，完成時若已有更新的事件，結果即作廢
+    取代原本「loading 旗標 + sleep」的防回跳作法：不阻塞、不丟掉最後一個事件
+    """
+
+    def __init__(self):
+        self._seq = {}
+        self._emitted = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        #鎖不能複製；gr.State 可能 deepcopy 狀態
+        return {"seq": dict(self._seq), "emitted": dict(self._emitted)}
+
+    def __setstate__(self, state):
+        self._seq = state["seq"]
+        self._emitted = state["emitted"]
+        self._lock = threading.Lock()
+
+    def begin(self, channel):
+        """開始處理一個事件，回傳其序號"""
+        with self._lock:
+            ticket = self._seq.get(channel, 0) + 1
+            self._seq[channel] = ticket
+            return ticket
+
+    def is_latest(self, channel, ticket):
+        """該序號是否仍是頻道內最新的事件"""
+        return self._seq.get(channel, 0) == ticket
+
+    def emit(self, channel, value):
+        """記錄程式設定到連動元件上的值，用來辨識它觸發的回傳事件"""
+        with self._lock:
+            self._emitted[channel] = value
+
+    def is_echo(self, channel, value):
+        """
+        事件值是否只是程式先前設定值的回響
+        每次設定只抵銷一次回響：比對成功後即清除，之後使用者再選同一個值時照常處理
+        """
+        with self._lock:
+            if channel in self._emitted and self._emitted[channel] == value:
+                del self._emitted[channel]
+                return True
+            return False
@@ -0,0 +1,180 @@
+"""
+批次 AI 擴充提詞：從檔案讀入描述，以與「AI擴充」相同的系統提示送出，
+限制同時請求數並以 token bucket 控制每分鐘請求數，結果完成一筆寫出一筆（JSONL）
+輸出檔同時也是檢查點：中斷後以相同參數重跑，已成功的項目會略過
+
+用法：
+python -m charselect.expand inputs.txt --output expanded.jsonl --concurrency 8 --rpm 60
+輸入為每行一筆描述的 .txt，或每行 {"id": ..., "input": ...} 的 .jsonl
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from charselect.aicache import ResponseCache, cache_key
+from charselect.aiclient import PRIME_DIRECTIVE, AIClient, AIRequestError, expansion_messages
+
+
+class TokenBucket:
+    """
+    非同步 token bucket：平均每秒 rate 個請求，最多累積 capacity 個
+    Parameters:
+    rate (float): 每秒補充的 token 數
+    capacity (float): 容量，即允許的瞬間突發請求數
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("rate 必須大於 0")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def read_inputs(path):
+    """逐筆讀出 (id, 描述)；.txt 以行號為 id，空行略過"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    yield str(item["id"]), item["input"]
+        else:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield str(number), line.strip()
+
+
+def completed_ids(path):
+    """輸出檔中已成功的 id"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                #中斷時寫到一半的最後一行
+                continue
+            if "output" in result:
+                done.add(result["id"])
+    return done
+
+
+async def expand_all(client, items, on_result, concurrency=4, bucket=None, cache=None):
+    """
+    以 concurrency 個工作者同時擴充 items，每完成一筆呼叫 on_result(result)
+    Parameters:
+    client (AIClient): 共用用戶端，連線池大小應不小於 concurrency
+    items (iterable): (id, 描述)，逐筆取用，不會一次全部讀入
+    on_result (callable): 結果為 dict：id、input、seconds，以及 output 或 error / status
+    bucket (TokenBucket): 請求速率限制，None 為不限制
+    cache (ResponseCache): 回覆快取，None 為不使用
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="expand")
+    items = iter(items)
+
+    def call(text):
+        fetch = lambda: client.complete(expansion_messages(text))
+        if cache is None:
+            return fetch()
+        return cache.fetch(cache_key(client.base_url, client.model, PRIME_DIRECTIVE, text), fetch)
+
+    async def worker():
+        for item_id, text in items:
+            if bucket is not None:
+                await bucket.acquire()
+            start = time.perf_counter()
+            result = {"id": item_id, "input": text}
+            try:
+                result["output"] = await loop.run_in_executor(executor, call, text)
+            except AIRequestError as e:
+                result["error"] = str(e)
+                result["status"] = e.status
+            except Exception as e:
+                #其他錯誤（例如回應格式不對）只算這一筆失敗，其餘項目照常處理並寫入斷點
+                result["error"] = f"{type(e).__name__}: {e}"
+                result["status"] = None
+            result["seconds"] = round(time.perf_counter() - start, 3)
+            on_result(result)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        executor.shutdown(wait=False)
+
+
+def run(input_path, output_path, client, concurrency=4, rpm=None, burst=1, cache=None):
+    """
+    執行批次擴充並附加寫入 output_path，略過其中已成功的項目
+    Returns:
+    dict: 本次的成功、失敗、略過筆數與耗時
+    """
+    done = completed_ids(output_path)
+    summary = {"ok": 0, "failed": 0, "skipped": 0}
+
+    def pending():
+        for item_id, text in read_inputs(input_path):
+            if item_id in done:
+                summary["skipped"] += 1
+            else:
+                yield item_id, text
+
+    start = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as f:
+        def on_result(result):
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            summary["ok" if "output" in result else "failed"] += 1
+            status = "成功" if "output" in result else f"失敗：{result['error']}"
+            print(f"[{summary['ok'] + summary['failed']}] {result['id']} {status}（{result['seconds']:.2f}s）", file=sys.stderr)
+
+        bucket = TokenBucket(rpm / 60.0, burst) if rpm else None
+        asyncio.run(expand_all(client, pending(), on_result, concurrency, bucket, cache))
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="批次 AI 擴充提詞")
+    parser.add_argument("input", help="輸入檔（.txt 每行一筆，或 .jsonl）")
+    parser.add_argument("--output", required=True, help="輸出 JSONL，亦作為續跑的檢查點")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時請求數")
+    parser.add_argument("--rpm", type=float, default=None, help="每分鐘最多請求數，未指定為不限制")
+    parser.add_argument("--burst", type=int, default=1, help="允許的瞬間突發請求數")
+    parser.add_argument("--settings", default="custom_settings.json", help="讀取 base_url / api_key / model 的設定檔")
+    parser.add_argument("--base-url", default=None, help="覆寫設定檔的 base_url")
+    parser.add_argument("--cache", default=None, help="回覆快取路徑（例如 ai_cache.sqlite3），未指定為不使用")
+    args = parser.parse_args()
+
+    with open(args.settings, "r", encoding="utf-8") as f:
+        settings = json.load(f)
+    if args.base_url:
+        settings["base_url"] = args.base_url
+    client = AIClient.from_settings(settings, pool_size=args.concurrency)
+    cache = ResponseCache(args.cache) if args.cache else None
+
+    summary = run(args.input, args.output, client, args.concurrency, args.rpm, args.burst, cache)
+    print(f"完成：成功 {summary['ok']} 筆，失敗 {summary['failed']} 筆，略過 {summary['skipped']} 筆，"
+          f"耗時 {summary['seconds']:.1f}s", file=sys.stderr)
+    print(f"延遲統計：{client.stats.snapshot()}", file=sys.stderr)
@@ -0,0 +1,329 @@
+"""預覽圖存取：啟動時只建立索引，需要時才讀取單張圖片"""
+import base64
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+NUM_PARTS = 10
+PACK_FILE = "previews.pack"
+
+# 預覽包格式（little endian）：
+#   標頭   magic, 版本, 保留, 筆數, 索引位移, 名稱區位移, 來源資訊位移, 來源資訊長度
+#   資料區 原始圖片位元組依序排列
+#   索引   每筆 (名稱位移, 名稱長度, 資料位移, 資料長度)，依 UTF-8 名稱排序
+#   名稱區 UTF-8 名稱
+#   來源資訊 JSON，記錄產生時各分片的大小與修改時間，用於判斷是否過期
+PACK_MAGIC = b"CSPK"
+PACK_VERSION = 1
+_HEADER = struct.Struct("<4sHHIQQQI")
+_ENTRY = struct.Struct("<IIQI")
+
+# output_N.json 內容為 [{"名稱": "data:image/webp;base64,..."}, ...]
+# 以正規表示式找出名稱；base64 內不會出現引號或反斜線，值的結尾直接用 find 找下一個引號
+_KEY_RE = re.compile(rb'"((?:[^"\\]|\\.)*)"\s*:\s*"')
+
+
+def shard_paths(basedir, num_parts=NUM_PARTS):
+    """回傳 output_1.json ... output_N.json 的完整路徑"""
+    return [os.path.join(basedir, f"output_{i+1}.json") for i in range(num_parts)]
+
+
+def _decode_key(raw):
+    if b"\\" in raw:
+        return json.loads(b'"' + raw + b'"')
+    return raw.decode("utf-8")
+
+
+def guess_mime(data):
+    """依檔頭判斷圖片格式"""
+    head = bytes(data[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "application/octet-stream"
+
+
+def data_url_to_bytes(data_url):
+    """將 data URL（或純 base64 字串）轉為圖片位元組"""
+    if "base64," in data_url:
+        data_url = data_url.split("base64,", 1)[1]
+    return base64.b64decode(data_url)
+
+
+class JsonPreviewStore:
+    """
+    以 output_N.json 分片為來源的預覽圖庫
+    啟動時只掃描一次分片，建立 名稱 → (分片, 位移, 長度) 索引；
+    圖片內容不常駐記憶體，查詢時才從檔案讀出該段 data URL
+    已有索引（例如啟動快照）時以 index 傳入，不再掃描分片
+    """
+
+    def __init__(self, paths, index=None, max_workers=4):
+        self.paths = list(paths)
+        if index is not None:
+            self.index = index
+            return
+        self.index = {}
+        # 各分片並行掃描（主要重疊檔案讀取），依分片順序合併，重複的名稱仍以後出現者為準
+        if max_workers > 1 and len(self.paths) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(self.paths))) as executor:
+                results = list(executor.map(self._scan, range(len(self.paths)), self.paths))
+        else:
+            results = [self._scan(shard, path) for shard, path in enumerate(self.paths)]
+        for entries in results:
+            self.index.update(entries)
+
+    def _scan(self, shard, path):
+        """掃描單一分片，回傳 {名稱: (分片, 位移, 長度)}"""
+        entries = {}
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return entries
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    pos = 0
+                    while True:
+                        m = _KEY_RE.search(mm, pos)
+                        if m is None:
+                            break
+                        start = m.end()
+                        end = mm.find(b'"', start)
+                        if end < 0:
+                            break
+                        # 與原本相同：重複的名稱以後出現者為準
+                        entries[_decode_key(m.group(1))] = (shard, start, end - start)
+                        pos = end + 1
+        except FileNotFoundError as e:
+            print(f"{e}\n{path} not found, check if it exists or if you have moved it.")
+        return entries
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def names(self):
+        """回傳排序後的所有名稱"""
+        return sorted(self.index)
+
+    def get(self, name, default=None):
+        """讀取單張預覽圖的 data URL"""
+        entry = self.index.get(name)
+        if entry is None:
+            return default
+        shard, offset, length = entry
+        with open(self.paths[shard], "rb") as f:
+            f.seek(offset)
+            return f.read(length).decode("ascii")
+
+    def items(self):
+        """依名稱排序逐一產生 (名稱, 圖片位元組)，同一分片只開檔一次"""
+        files = {}
+        try:
+            for name in self.names():
+                shard, offset, length = self.index[name]
+                f = files.get(shard)
+                if f is None:
+                    f = files[shard] = open(self.paths[shard], "rb")
+                f.seek(offset)
+                yield name, data_url_to_bytes(f.read(length).decode("ascii"))
+        finally:
+            for f in files.values():
+                f.close()
+
+    def get_bytes(self, name):
+        """讀取單張預覽圖的原始圖片位元組，找不到時回傳 None"""
+        data_url = self.get(name)
+        if data_url is None:
+            return None
+        return data_url_to_bytes(data_url)
+
+    def open_image(self, name):
+        """讀取並解碼單張預覽圖為 PIL Image，找不到時回傳 None"""
+        data = self.get_bytes(name)
+        if data is None:
+            return None
+        from PIL import Image
+        return Image.open(io.BytesIO(data))
+
+
+class PackPreviewStore:
+    """
+    以 previews.pack 為來源的預覽圖庫
+    檔案以 mmap 開啟，開啟時由排序索引建立 名稱 → (位移, 長度) 雜湊表，
+    回傳的圖片位元組是 mmap 的零複製切片
+    已有索引（例如啟動快照）時以 index 傳入，不再解碼檔案中的索引
+    """
+
+    def __init__(self, path, index=None):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} 是空檔案")
+        self._view = memoryview(self._mm)
+        magic, version, _, self.count, self._index_offset, self._names_offset, meta_offset, meta_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            self.close()
+            raise ValueError(f"{path} 不是有效的預覽包")
+        self.meta = json.loads(bytes(self._mm[meta_offset:meta_offset + meta_len]).decode("utf-8"))
+        if index is not None:
+            self.index = index
+            return
+        self.index = {}
+        for name_off, name_len, data_off, data_len in _ENTRY.iter_unpack(self._mm[self._index_offset:self._names_offset]):
+            start = self._names_offset + name_off
+            self.index[self._mm[start:start + name_len].decode("utf-8")] = (data_off, data_len)
+
+    def close(self):
+        self._view.release()
+        self._mm.close()
+        self._file.close()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def names(self):
+        """回傳排序後的所有名稱"""
+        # 索引在檔案中已依名稱排序，dict 保留插入順序
+        return list(self.index)
+
+    def get_bytes(self, name):
+        """回傳單張預覽圖位元組（memoryview，零複製），找不到時回傳 None"""
+        entry = self.index.get(name)
+        if entry is None:
+            return None
+        data_off, data_len = entry
+        return self._view[data_off:data_off + data_len]
+
+    def get(self, name, default=None):
+        """讀取單張預覽圖的 data URL，與 JsonPreviewStore 相容"""
+        data = self.get_bytes(name)
+        if data is None:
+            return default
+        return f"data:{guess_mime(data)};base64," + base64.b64encode(data).decode("ascii")
+
+    def open_image(self, name):
+        """讀取並解碼單張預覽圖為 PIL Image，找不到時回傳 None"""
+        data = self.get_bytes(name)
+        if data is None:
+            return None
+        from PIL import Image
+        return Image.open(io.BytesIO(data))
+
+
+def source_signature(paths):
+    """記錄來源分片的大小與修改時間，用來判斷預覽包是否過期"""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append([os.path.basename(path), st.st_size, st.st_mtime_ns])
+        except FileNotFoundError:
+            signature.append([os.path.basename(path), -1, -1])
+    return signature
+
+
+def build_pack(paths, output_path):
+    """
+    將 output_N.json 分片轉換為預覽包
+    Parameters:
+    paths (list): 來源分片路徑
+    output_path (str): 預覽包輸出路徑
+    Returns:
+    int: 寫入的圖片數量
+    """
+    store = JsonPreviewStore(paths)
+    meta = json.dumps({"sources": source_signature(paths)}).encode("utf-8")
+    entries = []
+    names = bytearray()
+    #暫存檔名不固定：兩個實例同時產生時不會覆蓋或搬走對方的暫存檔
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(output_path) + ".", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with open(fd, "wb") as f:
+            f.write(b"\0" * _HEADER.size)
+            offset = _HEADER.size
+            # names() 已是字串排序，與 UTF-8 位元組排序一致；內容相同的圖片只寫一次，索引指向同一段資料
+            written = {}
+            for name, data in store.items():
+                encoded = name.encode("utf-8")
+                digest = hashlib.sha256(data).digest()
+                data_offset = written.get(digest)
+                if data_offset is None:
+                    data_offset = written[digest] = offset
+                    f.write(data)
+                    offset += len(data)
+                entries.append((len(names), len(encoded), data_offset, len(data)))
+                names += encoded
+            index_offset = offset
+            for entry in entries:
+                f.write(_ENTRY.pack(*entry))
+            names_offset = index_offset + len(entries) * _ENTRY.size
+            f.write(names)
+            meta_offset = names_offset + len(names)
+            f.write(meta)
+            f.seek(0)
+            f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, len(entries), index_offset, names_offset, meta_offset, len(meta)))
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(entries)
+
+
+def open_preview_store(basedir, num_parts=NUM_PARTS, build=True):
+    """
+    開啟預覽圖庫：優先使用最新的預覽包；過期或不存在時重新產生，失敗則退回直接讀取 JSON 分片
+    """
+    paths = shard_paths(basedir, num_parts)
+    pack_path = os.path.join(basedir, PACK_FILE)
+    signature = source_signature(paths)
+    if os.path.exists(pack_path):
+        try:
+            store = PackPreviewStore(pack_path)
+            if store.meta.get("sources") == signature:
+                return store
+            store.close()
+        except Exception as e:
+            print(f"錯誤：預覽包 '{pack_path}' 無法讀取 - {str(e)}")
+    if build:
+        try:
+            count = build_pack(paths, pack_path)
+            print(f"成功：已產生預覽包 '{pack_path}'（{count} 張）")
+            return PackPreviewStore(pack_path)
+        except Exception as e:
+            print(f"錯誤：預覽包產生失敗 - {str(e)}")
+    return JsonPreviewStore(paths)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="將 output_N.json 轉換為預覽包")
+    parser.add_argument("--basedir", default=".", help="output_N.json 所在資料夾")
+    parser.add_argument("--num-parts", type=int, default=NUM_PARTS, help="分片數量")
+    parser.add_argument("--output", default=None, help=f"輸出路徑，預設為 <basedir>/{PACK_FILE}")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(args.basedir, PACK_FILE)
+    count = build_pack(shard_paths(args.basedir, args.num_parts), output)
+    print(f"成功：已寫入 {count} 張預覽圖到 '{output}'（{os.path.getsize(output)} bytes）")
@@ -0,0 +1,112 @@
+"""啟動階段分析：各階段耗時與記憶體（tracemalloc），預設關閉"""
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+ENV_VAR = "CHARSELECT_PROFILE"
+
+
+class StartupProfiler:
+    """
+    以 start(階段名稱) 依序標記各階段，finish() 時輸出摘要並寫入一行 JSON 紀錄
+    停用時所有方法都不做事，可直接留在程式中
+    Parameters:
+    enabled (bool): 是否啟用
+    output_path (str): JSON Lines 紀錄檔路徑，None 表示不寫檔
+    """
+
+    def __init__(self, enabled=False, output_path=None, label="CharacterSelect"):
+        self.enabled = enabled
+        self.output_path = output_path
+        self.label = label
+        self.phases = []
+        self._current = None
+        self._started_tracing = False
+        self._t0 = None
+        self._t_end = None
+
+    @classmethod
+    def from_env(cls, output_path=None, label="CharacterSelect"):
+        """環境變數 CHARSELECT_PROFILE=1 時啟用"""
+        enabled = os.environ.get(ENV_VAR, "").lower() in ("1", "true", "yes")
+        return cls(enabled, output_path, label)
+
+    def start(self, name):
+        """結束上一個階段並開始新階段"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._t0 is None:
+            self._t0 = now
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        self._end_phase(now)
+        tracemalloc.reset_peak()
+        self._current = (name, now, tracemalloc.get_traced_memory()[0])
+
+    def _end_phase(self, now):
+        if self._current is None:
+            return
+        name, t0, mem0 = self._current
+        current, peak = tracemalloc.get_traced_memory()
+        self.phases.append({
+            "name": name,
+            "ms": round((now - t0) * 1000, 2),
+            "alloc_kb": round((current - mem0) / 1024, 1),
+            "peak_kb": round((peak - mem0) / 1024, 1),
+        })
+        self._current = None
+
+    def stop(self):
+        """
+        結束最後一個階段並固定總耗時；之後再呼叫 finish() 寫入紀錄
+        （例如等背景工作完成，把它們的耗時一併記下）
+        """
+        if not self.enabled or self._t0 is None:
+            return
+        self._t_end = time.perf_counter()
+        self._end_phase(self._t_end)
+
+    def finish(self, **extra):
+        """結束最後一個階段，印出摘要並寫入紀錄，回傳紀錄內容"""
+        if not self.enabled or self._t0 is None:
+            return None
+        now = self._t_end if self._t_end is not None else time.perf_counter()
+        self._end_phase(now)
+        current = tracemalloc.get_traced_memory()[0]
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        record = {
+            "label": self.label,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "total_ms": round((now - self._t0) * 1000, 2),
+            "retained_kb": round(current / 1024, 1),
+            "python": platform.python_version(),
+            "phases": self.phases,
+        }
+        record.update(extra)
+        print(self.report(record))
+        if self.output_path:
+            try:
+                with open(self.output_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"錯誤：無法寫入啟動分析紀錄 '{self.output_path}' - {str(e)}")
+        return record
+
+    @staticmethod
+    def report(record):
+        lines = [f"[{record['label']}] 啟動 {record['total_ms']:.1f} ms"]
+        for phase in record["phases"]:
+            lines.append(f"  {phase['name']:<12} {phase['ms']:>9.1f} ms  "
+                         f"+{phase['alloc_kb']:>9.1f} KB  峰值 {phase['peak_kb']:>9.1f} KB")
+        #背景工作：{名稱: {state, seconds, ...}}（Warmup.status()）
+        for name, task in record.get("background", {}).items():
+            seconds = task.get("seconds")
+            ms = f"{seconds * 1000:>9.1f} ms" if seconds is not None else f"{'-':>9} ms"
+            lines.append(f"  背景:{name:<9} {ms}  {task.get('state', '')}")
+        return "\n".join(lines)
@@ -0,0 +1,130 @@
+"""
+提詞組合：人物、動作、細節開關、AI 擴寫與使用者自填文字各自成段保存，
+只更新異動的段落，輸出到提詞框時依段落順序合併並去除重複標籤
+"""
+
+#輸出順序；使用者自填文字排在人物、動作之後，細節開關放最後
+SEGMENTS = ("character", "action", "user", "ai", "features")
+USER = "user"
+SEPARATOR = ","
+
+_OPEN = "([{<"
+_CLOSE = ")]}>"
+
+
+def split_tags(text):
+    """
+    以括號外的逗號切開提詞，去掉前後空白與空項目
+    (worst quality, bad quality:1.2) 與 <lora:name:0.5> 這類群組保持完整
+    """
+    if not text:
+        return []
+    if not any(ch in text for ch in _OPEN):
+        return [tag.strip() for tag in text.split(SEPARATOR) if tag.strip()]
+    tags = []
+    depth = 0
+    start = 0
+    for i, ch in enumerate(text):
+        if ch in _OPEN:
+            depth += 1
+        elif ch in _CLOSE:
+            if depth > 0:
+                depth -= 1
+        elif ch == SEPARATOR and depth == 0:
+            tag = text[start:i].strip()
+            if tag:
+                tags.append(tag)
+            start = i + 1
+    tag = text[start:].strip()
+    if tag:
+        tags.append(tag)
+    return tags
+
+
+def tag_key(tag):
+    """比對重複用的鍵：忽略多餘空白"""
+    return " ".join(tag.split())
+
+
+class PromptComposer:
+    """
+    分段保存的提詞
+    set() 只重新切分異動的段落；text() 合併結果會快取到下次異動為止
+    使用者直接在提詞框修改時，以 sync() 把文字框內容對回各段
+    """
+
+    __slots__ = ("order", "_segments", "_text")
+
+    def __init__(self, order=SEGMENTS):
+        self.order = tuple(order)
+        self._segments = {name: () for name in self.order}
+        self._text = None
+
+    def get(self, segment):
+        """段落目前的標籤"""
+        return self._segments[segment]
+
+    def set(self, segment, text):
+        """
+        取代一個段落的內容
+        Parameters:
+        segment (str): 段落名稱，需為 order 之一
+        text (str): 新內容，逗號分隔的提詞；空字串表示清空
+        Returns:
+        bool: 內容有變動時回傳 True
+        """
+        if segment not in self._segments:
+            raise KeyError(segment)
+        tags = tuple(split_tags(text))
+        if tags == self._segments[segment]:
+            return False
+        self._segments[segment] = tags
+        self._text = None
+        return True
+
+    def clear(self, *segments):
+        """清空指定段落，不指定時全部清空"""
+        for segment in segments or self.order:
+            self.set(segment, "")
+
+    def sync(self, textbox):
+        """
+        把提詞框目前的內容對回各段
+        與上次輸出相同時不做任何事；否則程式管理的段落只保留仍在提詞框內的標籤，
+        其餘標籤依原順序歸入使用者自填段落
+        """
+        if textbox is None or textbox == self.text():
+            return
+        tags = split_tags(textbox)
+        present = {tag_key(tag) for tag in tags}
+        managed = set()
+        for segment in self.order:
+            if segment == USER:
+                continue
+            kept = tuple(tag for tag in self._segments[segment] if tag_key(tag) in present)
+            self._segments[segment] = kept
+            managed.update(tag_key(tag) for tag in kept)
+        self._segments[USER] = tuple(tag for tag in tags if tag_key(tag) not in managed)
+        self._text = None
+
+    def tags(self):
+        """依段落順序合併並去除重複的標籤，先出現的段落優先"""
+        seen = set()
+        merged = []
+        for segment in self.order:
+            for tag in self._segments[segment]:
+                key = tag_key(tag)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(tag)
+        return merged
+
+    def text(self):
+        """輸出到提詞框的字串"""
+        if self._text is None:
+            tags = self.tags()
+            self._text = SEPARATOR.join(tags) + SEPARATOR if tags else ""
+        return self._text
+
+    def __str__(self):
+        return self.text()
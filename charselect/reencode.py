@@ -0,0 +1,290 @@
+"""
+預覽圖重新編碼與去除重複（離線工具）
+解碼 output_N.json 的每張預覽圖，縮小到指定的最大邊長並以 WebP / AVIF 重新編碼（多個行程並行），
+內容完全相同（sha256）或感知雜湊（dHash）相近的圖片改用同一張，再依大小重新平均分配到各分片，
+最後印出每個分片處理前後的大小
+
+用法：
+python -m charselect.reencode --basedir . --output optimized --max-size 200 --quality 80
+python -m charselect.reencode --basedir . --in-place --format avif --quality 50 --near 2
+python -m charselect.reencode --basedir . --dry-run
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from charselect.previews import NUM_PARTS, JsonPreviewStore, guess_mime, shard_paths
+
+FORMATS = {"webp": ("WEBP", "image/webp"), "avif": ("AVIF", "image/avif")}
+HASH_BITS = 64
+# 相近圖片的確認：32×32 灰階縮圖的平均像素差上限（0～255）
+THUMB_SIZE = 32
+MAX_DIFF = 2.0
+
+
+def dhash(image, size=8):
+    """差異雜湊：縮成 (size+1)×size 灰階後比較左右相鄰像素，回傳 size*size 位元的整數"""
+    from PIL import Image
+
+    resample = getattr(Image, "Resampling", Image).BILINEAR
+    gray = image.convert("L").resize((size + 1, size), resample)
+    pixels = gray.tobytes()
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def thumbnail_signature(image, size=THUMB_SIZE):
+    """size×size 灰階縮圖的像素位元組，用來確認 dHash 相近的圖片確實幾乎相同"""
+    from PIL import Image
+
+    resample = getattr(Image, "Resampling", Image).BILINEAR
+    return image.convert("L").resize((size, size), resample).tobytes()
+
+
+def mean_difference(a, b):
+    return sum(abs(x - y) for x, y in zip(a, b)) / len(a)
+
+
+def reencode(data, max_size=200, fmt="webp", quality=80):
+    """
+    解碼並重新編碼一張預覽圖（在子行程中執行）
+    Parameters:
+    data (bytes): 原始圖片
+    max_size (int): 最大邊長（像素），較小的圖片不放大
+    fmt (str): webp 或 avif
+    quality (int): 編碼品質
+    Returns:
+    tuple: (新圖片位元組, dHash, 灰階縮圖)；重新編碼沒有變小且原圖已符合尺寸與格式時沿用原圖
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    fingerprint = dhash(image)
+    thumbnail = thumbnail_signature(image)
+    original_fits = max(image.size) <= max_size and guess_mime(data) == FORMATS[fmt][1]
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+    if max(image.size) > max_size:
+        resample = getattr(Image, "Resampling", Image).LANCZOS
+        image.thumbnail((max_size, max_size), resample)
+    out = io.BytesIO()
+    if fmt == "webp":
+        image.save(out, FORMATS[fmt][0], quality=quality, method=6)
+    else:
+        image.save(out, FORMATS[fmt][0], quality=quality)
+    encoded = out.getvalue()
+    if original_fits and len(encoded) >= len(data):
+        encoded = data
+    return encoded, fingerprint, thumbnail
+
+
+def _reencode_chunk(chunk, max_size, fmt, quality):
+    return [reencode(data, max_size, fmt, quality) for data in chunk]
+
+
+def near_duplicate_groups(fingerprints, distance, thumbnails, max_diff=MAX_DIFF):
+    """
+    找出幾乎相同的圖片群組：dHash 漢明距離不超過 distance，且灰階縮圖平均像素差不超過 max_diff
+    （構圖相似的不同人物 dHash 也可能相同，必須再以縮圖確認）
+    把雜湊切成 distance+1 段，距離不超過 distance 的兩個雜湊至少有一段完全相同（鴿籠原理），
+    只比較同段相同的候選，不必兩兩比較
+    Parameters:
+    fingerprints (list): 各圖片的 dHash
+    thumbnails (list): 各圖片的 thumbnail_signature
+    Returns:
+    list: 每張圖片所屬群組的代表編號（union-find 的根）
+    """
+    parent = list(range(len(fingerprints)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    if distance < 0:
+        return parent
+    bands = distance + 1
+    width = -(-HASH_BITS // bands)
+    mask = (1 << width) - 1
+    for band in range(bands):
+        buckets = {}
+        for i, value in enumerate(fingerprints):
+            buckets.setdefault((value >> (band * width)) & mask, []).append(i)
+        for members in buckets.values():
+            for a in range(len(members)):
+                for b in range(a + 1, len(members)):
+                    i, j = members[a], members[b]
+                    ri, rj = find(i), find(j)
+                    if ri == rj or bin(fingerprints[i] ^ fingerprints[j]).count("1") > distance:
+                        continue
+                    if mean_difference(thumbnails[i], thumbnails[j]) <= max_diff:
+                        parent[max(ri, rj)] = min(ri, rj)
+    return [find(i) for i in range(len(parent))]
+
+
+def rebalance(names, sizes, num_parts=NUM_PARTS):
+    """
+    依名稱順序把圖片連續分配到 num_parts 個分片，讓各分片大小盡量平均
+    Returns:
+    list: 每個分片的名稱清單
+    """
+    total = sum(sizes[name] for name in names)
+    shards = [[] for _ in range(num_parts)]
+    filled = 0
+    for name in names:
+        # 以目前累計大小的中點決定分片，大檔案不會讓後面的分片全部往後擠
+        part = min(num_parts - 1, int((filled + sizes[name] / 2) * num_parts / total)) if total else 0
+        shards[part].append(name)
+        filled += sizes[name]
+    return shards
+
+
+def write_shard(path, entries):
+    """以與原本相同的格式 [{"名稱": "data:...;base64,..."}, ...] 寫出分片（先寫暫存檔再替換）"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump([{name: data_url} for name, data_url in entries], f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def optimize(basedir, output_dir=None, num_parts=NUM_PARTS, max_size=200, fmt="webp", quality=80,
+             near=0, max_diff=MAX_DIFF, jobs=None, chunk_size=64):
+    """
+    重新編碼、去除重複並重新分配分片
+    Parameters:
+    basedir (str): output_N.json 所在資料夾
+    output_dir (str): 輸出資料夾，與 basedir 相同時覆寫原檔；None 表示只產生報告
+    near (int): 視為相同圖片的 dHash 漢明距離上限，-1 表示只合併完全相同的圖片
+    max_diff (float): 視為相同圖片的灰階縮圖平均像素差上限
+    jobs (int): 行程數，預設為 CPU 核心數
+    Returns:
+    dict: 各分片處理前後的筆數與大小，以及去除重複的統計
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"不支援的格式：{fmt}")
+    start = time.perf_counter()
+    paths = shard_paths(basedir, num_parts)
+    store = JsonPreviewStore(paths)
+    before = []
+    for shard, path in enumerate(paths):
+        count = sum(1 for entry in store.index.values() if entry[0] == shard)
+        before.append({"count": count, "bytes": os.path.getsize(path) if os.path.exists(path) else 0})
+
+    #完全相同的原圖只重新編碼一次
+    names = []
+    blob_of = {}
+    blobs = []
+    blob_ids = {}
+    for name, data in store.items():
+        digest = hashlib.sha256(data).digest()
+        blob = blob_ids.get(digest)
+        if blob is None:
+            blob = blob_ids[digest] = len(blobs)
+            blobs.append(data)
+        names.append(name)
+        blob_of[name] = blob
+
+    chunks = [blobs[i:i + chunk_size] for i in range(0, len(blobs), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for chunk_result in pool.map(_reencode_chunk, chunks, [max_size] * len(chunks),
+                                     [fmt] * len(chunks), [quality] * len(chunks)):
+            results.extend(chunk_result)
+
+    #相近的圖片改用群組中原圖最大（通常畫質最好）的一張
+    roots = near_duplicate_groups([r[1] for r in results], near, [r[2] for r in results], max_diff)
+    canonical = {}
+    for blob, root in enumerate(roots):
+        best = canonical.get(root)
+        if best is None or len(blobs[blob]) > len(blobs[best]):
+            canonical[root] = blob
+    encoded = {blob: results[canonical[roots[blob]]][0] for blob in range(len(blobs))}
+
+    data_urls = {}
+    sizes = {}
+    for name in names:
+        data = encoded[blob_of[name]]
+        data_urls[name] = f"data:{guess_mime(data)};base64," + base64.b64encode(data).decode("ascii")
+        sizes[name] = len(data_urls[name])
+
+    shards = rebalance(names, sizes, num_parts)
+    after = []
+    for shard, shard_names in enumerate(shards):
+        entries = [(name, data_urls[name]) for name in shard_names]
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            path = os.path.join(output_dir, os.path.basename(paths[shard]))
+            write_shard(path, entries)
+            size = os.path.getsize(path)
+        else:
+            size = len(json.dumps([{name: data_url} for name, data_url in entries], indent=2))
+        after.append({"count": len(entries), "bytes": size})
+
+    return {
+        "shards": [{"shard": os.path.basename(path), "before": b, "after": a}
+                   for path, b, a in zip(paths, before, after)],
+        "images": len(names),
+        "unique_before": len(blobs),
+        "unique_after": len(set(canonical.values())),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def format_size(size):
+    return f"{size / 1024 / 1024:.2f} MB" if size >= 1024 * 1024 else f"{size / 1024:.1f} KB"
+
+
+def print_report(report):
+    print(f"{'分片':<16}{'原筆數':>8}{'原大小':>14}{'新筆數':>8}{'新大小':>14}{'比例':>8}")
+    total_before = total_after = 0
+    for row in report["shards"]:
+        b, a = row["before"], row["after"]
+        total_before += b["bytes"]
+        total_after += a["bytes"]
+        ratio = f"{a['bytes'] / b['bytes']:.0%}" if b["bytes"] else "-"
+        print(f"{row['shard']:<16}{b['count']:>8}{format_size(b['bytes']):>14}{a['count']:>8}{format_size(a['bytes']):>14}{ratio:>8}")
+    ratio = f"{total_after / total_before:.0%}" if total_before else "-"
+    print(f"{'合計':<16}{report['images']:>8}{format_size(total_before):>14}{report['images']:>8}{format_size(total_after):>14}{ratio:>8}")
+    print(f"不重複圖片：{report['unique_before']} → {report['unique_after']}，耗時 {report['seconds']}s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="預覽圖重新編碼與去除重複")
+    parser.add_argument("--basedir", default=".", help="output_N.json 所在資料夾")
+    parser.add_argument("--output", default=None, help="輸出資料夾")
+    parser.add_argument("--in-place", action="store_true", help="直接覆寫 basedir 中的分片")
+    parser.add_argument("--dry-run", action="store_true", help="只印出報告，不寫檔")
+    parser.add_argument("--num-parts", type=int, default=NUM_PARTS, help="分片數量")
+    parser.add_argument("--max-size", type=int, default=200, help="最大邊長（像素）")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="webp", help="輸出格式")
+    parser.add_argument("--quality", type=int, default=80, help="編碼品質")
+    parser.add_argument("--near", type=int, default=0,
+                        help="視為相同圖片的 dHash 漢明距離上限（0 為雜湊相同，-1 只合併完全相同的檔案）")
+    parser.add_argument("--max-diff", type=float, default=MAX_DIFF,
+                        help="dHash 相近時，視為相同圖片的 32×32 灰階縮圖平均像素差上限（0～255）")
+    parser.add_argument("--jobs", type=int, default=None, help="行程數，預設為 CPU 核心數")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        output_dir = None
+    elif args.in_place:
+        output_dir = args.basedir
+    elif args.output:
+        output_dir = args.output
+    else:
+        parser.error("請指定 --output、--in-place 或 --dry-run")
+    print_report(optimize(args.basedir, output_dir, args.num_parts, args.max_size, args.format,
+                          args.quality, args.near, args.max_diff, args.jobs))
@@ -0,0 +1,98 @@
+"""
+自訂設定檔的熱重新載入：以大小與修改時間輪詢，只重新解析有變動的檔案
+JSON 無效時印出錯誤並繼續使用上一個有效版本，檔案再次修改後才重試
+"""
+import json
+import os
+import threading
+import time
+
+
+class WatchedFile:
+    """
+    單一 JSON 檔的變動偵測
+    建立時即記錄目前的大小與修改時間（視為已載入），之後 poll() 只在檔案變動時解析
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.signature = self._stat()
+        self.error = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def poll(self):
+        """
+        檔案有變動時重新解析
+        Returns:
+        新內容；未變動、檔案不存在或 JSON 無效時回傳 None
+        """
+        signature = self._stat()
+        if signature == self.signature:
+            return None
+        #無效的版本也記下來，同一個錯誤不會每次輪詢都印出
+        self.signature = signature
+        if signature is None:
+            self.error = "檔案不存在"
+            print(f"錯誤：'{self.path}' 不存在，繼續使用上一個版本")
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            if not isinstance(value, dict):
+                raise ValueError("最外層必須是物件")
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            print(f"錯誤：'{self.path}' 無法載入，繼續使用上一個版本 - {self.error}")
+            return None
+        self.error = None
+        return value
+
+
+class ConfigWatcher:
+    """
+    多個 JSON 檔的輪詢，兩次檢查至少間隔 interval 秒（執行緒安全）
+    Parameters:
+    paths (dict): {名稱: 路徑}
+    interval (float): 最短輪詢間隔秒數
+    """
+
+    def __init__(self, paths, interval=5.0):
+        self.files = {name: WatchedFile(path) for name, path in paths.items()}
+        self.interval = interval
+        self._next = time.monotonic() + interval
+        self._lock = threading.Lock()
+
+    def due(self):
+        """是否到了下一次輪詢的時間；回傳 True 時同時預約下一次，同一時段只有一個呼叫端會得到 True"""
+        now = time.monotonic()
+        if now < self._next:
+            return False
+        with self._lock:
+            if now < self._next:
+                return False
+            self._next = now + self.interval
+            return True
+
+    def poll(self):
+        """
+        檢查所有檔案
+        Returns:
+        dict: 有變動且有效的 {名稱: 新內容}
+        """
+        with self._lock:
+            changed = {}
+            for name, watched in self.files.items():
+                value = watched.poll()
+                if value is not None:
+                    changed[name] = value
+            return changed
+
+    def errors(self):
+        """目前內容無效、仍使用上一個版本的 {名稱: 錯誤訊息}"""
+        return {name: watched.error for name, watched in self.files.items() if watched.error}
@@ -0,0 +1,285 @@
+"""人物搜尋：n-gram 倒排索引，支援英文提示詞、繁簡中文名稱、作品名稱與拼音縮寫"""
+import heapq
+import re
+import unicodedata
+from array import array
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+_SEPARATOR_RE = re.compile(r"[\W_]+")
+_SERIES_RE = re.compile(r"^(.*?)[ _]\(series\)$")
+
+# 各欄位的權重：名稱 > 別名 > 作品名稱
+WEIGHT_NAME = 1.0
+WEIGHT_ALIAS = 0.8
+WEIGHT_SERIES = 0.6
+
+
+def normalize(text):
+    """全半形統一、轉小寫，標點與底線改為空白"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _SEPARATOR_RE.sub(" ", text).strip()
+
+
+def _is_cjk(ch):
+    return ch > "⹿"
+
+
+def text_grams(text):
+    """索引用 gram：各詞的 bigram、詞首 gram，以及中日文單字"""
+    grams = set()
+    for token in text.split():
+        padded = " " + token
+        for i in range(len(padded) - 1):
+            grams.add(padded[i:i + 2])
+        for ch in token:
+            if _is_cjk(ch):
+                grams.add(ch)
+    return grams
+
+
+def query_grams(query):
+    """查詢用 gram：不含詞首 gram，讓字串中段也能命中；單一字元時改用詞首 gram"""
+    grams = set()
+    for token in query.split():
+        if len(token) == 1:
+            grams.add(token if _is_cjk(token) else " " + token)
+            continue
+        for i in range(len(token) - 1):
+            grams.add(token[i:i + 2])
+    return grams
+
+
+def series_names(prompt):
+    """由提示詞的標籤取出作品名稱，例如 aikatsu!_(series) → aikatsu!，以及第一個標籤"""
+    tags = [tag.strip() for tag in prompt.split(",") if tag.strip()]
+    names = []
+    for tag in tags:
+        m = _SERIES_RE.match(tag)
+        if m:
+            names.append(m.group(1))
+    if len(tags) > 1:
+        names.append(tags[0])
+    return names
+
+
+def romaji_aliases(prompt):
+    """「姓 名」兩個字的人物標籤加上「名 姓」的別名"""
+    aliases = []
+    for tag in prompt.split(","):
+        tag = tag.strip()
+        if "(" in tag or "_" in tag:
+            continue
+        words = tag.split()
+        if len(words) == 2:
+            aliases.append(f"{words[1]} {words[0]}")
+    return aliases
+
+
+def pinyin_aliases(zhname):
+    """中文名稱的拼音與拼音縮寫（需安裝 pypinyin，否則略過）"""
+    if lazy_pinyin is None:
+        return []
+    # 括號內通常是作品名稱，只取人物名稱部分
+    name = zhname.split("(")[0].strip()
+    if not name:
+        return []
+    full = "".join(lazy_pinyin(name))
+    initials = "".join(lazy_pinyin(name, style=Style.FIRST_LETTER))
+    return [full, initials]
+
+
+class SearchIndex:
+    """
+    n-gram 倒排索引
+    documents 為 (key, [(欄位文字, 權重), ...]) 的序列；查詢回傳依分數排序的 (key, 分數)
+    短查詢（不超過 PREFIX_LEN 字）直接查預先排好名次的前綴表；
+    較長的查詢先以最少見的幾個 gram 取交集，再驗證與計分，完全沒有符合時才做模糊比對
+    """
+
+    __slots__ = ("keys", "fields", "postings", "prefixes")
+
+    PREFIX_LEN = 3
+    PREFIX_TOP_K = 50
+    FUZZY_LIMIT = 5000
+
+    def __init__(self, documents):
+        self.keys = []
+        self.fields = []
+        postings = {}
+        prefixes = {}
+        for key, fields in documents:
+            doc = len(self.keys)
+            normalized = []
+            grams = set()
+            for text, weight in fields:
+                text = normalize(text)
+                if text:
+                    normalized.append((text, weight))
+                    grams |= text_grams(text)
+            self.keys.append(key)
+            self.fields.append(tuple(normalized))
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array("I")
+                posting.append(doc)
+            if normalized:
+                rank = (-len(normalized[0][0]), -doc)
+                for prefix, score in self._prefix_scores(normalized).items():
+                    heap = prefixes.get(prefix)
+                    if heap is None:
+                        heap = prefixes[prefix] = []
+                    entry = (score,) + rank
+                    if len(heap) < self.PREFIX_TOP_K:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+        self.postings = postings
+        self.prefixes = {p: tuple((-d, score) for score, _, d in sorted(heap, reverse=True))
+                         for p, heap in prefixes.items()}
+
+    @classmethod
+    def _prefix_scores(cls, fields):
+        # 欄位開頭 80、詞首 60、中日文字中段 40，剛好等於整個欄位 100
+        scores = {}
+        for text, weight in fields:
+            starts = [0]
+            for i, ch in enumerate(text):
+                if ch == " ":
+                    starts.append(i + 1)
+                elif i and _is_cjk(ch):
+                    starts.append(i)
+            for start in starts:
+                if start == 0:
+                    tier = 80.0
+                elif text[start - 1] == " ":
+                    tier = 60.0
+                else:
+                    tier = 40.0
+                for length in range(1, min(cls.PREFIX_LEN, len(text) - start) + 1):
+                    prefix = text[start:start + length]
+                    if prefix.endswith(" "):
+                        break
+                    score = (100.0 if start == 0 and length == len(text) else tier) * weight
+                    if score > scores.get(prefix, 0.0):
+                        scores[prefix] = score
+        return scores
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def _score(query, grams, fields):
+        best = 0.0
+        for text, weight in fields:
+            if text == query:
+                score = 100.0
+            elif text.startswith(query):
+                score = 80.0
+            elif (" " + query) in text:
+                score = 60.0
+            elif query in text:
+                score = 40.0
+            else:
+                padded = " " + text
+                score = 30.0 * sum(1 for g in grams if g in padded) / len(grams)
+            score *= weight
+            if score > best:
+                best = score
+        return best
+
+    def _rank(self, query, grams, docs, k):
+        fields = self.fields
+        scored = []
+        for doc in docs:
+            score = self._score(query, grams, fields[doc])
+            if score > 0:
+                # 分數相同時，較短的名稱、較前面的位置優先
+                scored.append((score, -len(fields[doc][0][0]), -doc))
+        return [(-neg_doc, score) for score, _, neg_doc in heapq.nlargest(k, scored)]
+
+    def _matches(self, query, lists):
+        # 取最少見的三個 gram 交集，再確認整個查詢字串確實出現
+        candidates = set(lists[0])
+        for posting in lists[1:3]:
+            if not candidates:
+                break
+            candidates.intersection_update(posting)
+        fields = self.fields
+        return [doc for doc in candidates if any(query in text for text, _ in fields[doc])]
+
+    def _fuzzy(self, lists):
+        # 容許 1/3 的 gram 不命中：符合條件的文件必定出現在最少見的 (misses + 1) 個 gram 之一
+        misses = max(1, len(lists) // 3)
+        candidates = set()
+        for posting in lists[:misses + 1]:
+            candidates.update(posting)
+            if len(candidates) >= self.FUZZY_LIMIT:
+                break
+        return candidates
+
+    def search(self, query, k=20):
+        """回傳最相關的前 k 筆 (key, 分數)"""
+        query = normalize(query)
+        if not query:
+            return []
+        results = []
+        if len(query) <= self.PREFIX_LEN:
+            results = list(self.prefixes.get(query, ())[:k])
+        if len(results) < k:
+            grams = query_grams(query)
+            if grams:
+                lists = sorted((self.postings.get(g, ()) for g in grams), key=len)
+                seen = {doc for doc, _ in results}
+                docs = [doc for doc in self._matches(query, lists) if doc not in seen] if lists[0] else []
+                found = self._rank(query, grams, docs, k - len(results))
+                if not results and not found and len(grams) > 1:
+                    seen.update(doc for doc, _ in found)
+                    fuzzy = [doc for doc in self._fuzzy(lists) if doc not in seen]
+                    found += self._rank(query, grams, fuzzy, k - len(results) - len(found))
+                results += found
+        return [(self.keys[doc], score) for doc, score in results]
+
+
+def build_character_index(catalog, extra_localizations=()):
+    """
+    由 CharacterCatalog 建立搜尋索引
+    Parameters:
+    catalog (CharacterCatalog): 人物目錄（含 zh_TW 名稱）
+    extra_localizations (list): 其他語系的 {中文名稱: 提示詞}，例如 zh_CN.json
+    """
+    extra = {}
+    for localizations in extra_localizations:
+        for zhname, prompt in localizations.items():
+            extra.setdefault(prompt, []).append(zhname)
+
+    def documents():
+        for name, prompt in zip(catalog.names, catalog.prompts):
+            if not prompt:
+                continue
+            fields = [(name, WEIGHT_NAME)]
+            if prompt != name:
+                fields.append((prompt, WEIGHT_ALIAS))
+            zhnames = []
+            zhname = catalog.localized(prompt)
+            if zhname:
+                zhnames.append(zhname)
+            for other in extra.get(prompt, ()):
+                if other not in zhnames:
+                    zhnames.append(other)
+            for zh in zhnames:
+                fields.append((zh, WEIGHT_NAME))
+            for alias in romaji_aliases(prompt):
+                fields.append((alias, WEIGHT_ALIAS))
+            if zhnames:
+                for alias in pinyin_aliases(zhnames[0]):
+                    fields.append((alias, WEIGHT_ALIAS))
+            for series in series_names(prompt):
+                fields.append((series, WEIGHT_SERIES))
+            yield name, fields
+
+    return SearchIndex(documents())
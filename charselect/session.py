@@ -0,0 +1,38 @@
+"""每個瀏覽器工作階段各自的互動狀態，由 gr.State 保存並在處理函式間傳遞"""
+from charselect.coalesce import LatestWins
+from charselect.prompt import PromptComposer
+
+
+class SessionState:
+    """
+    原本放在共用腳本實例上的互動狀態
+    每位使用者一份，處理函式只讀寫自己的這份，多位使用者同時操作不會互相覆蓋
+    """
+
+    __slots__ = (
+        "composer", "coalescer",
+        "hm1prompt", "hm2prompt", "hm1btntext", "hm2btntext",
+        "locked1", "locked2", "allfuncprompt", "oldcprompt", "choices_loaded",
+    )
+
+    def __init__(self):
+        #提詞依人物、動作、細節、AI 擴寫、自填文字分段保存
+        self.composer = PromptComposer()
+        #連動元件（人物、中文人物、滑桿）的事件只採用最新一次，避免回跳
+        self.coalescer = LatestWins()
+        self.hm1prompt = ""
+        self.hm2prompt = ""
+        self.hm1btntext = ""
+        self.hm2btntext = ""
+        self.locked1 = ""
+        self.locked2 = ""
+        self.allfuncprompt = ""
+        #前一次的 cprompt
+        self.oldcprompt = ""
+        #介面建立時目錄尚未載入完成：這個工作階段的人物、動作選單是否已填入選項
+        self.choices_loaded = False
+
+    @classmethod
+    def ensure(cls, state):
+        """gr.State 的初始值為 None，第一次事件時才建立"""
+        return cls() if state is None else state
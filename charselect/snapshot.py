@@ -0,0 +1,178 @@
+"""
+啟動快照：把合併排序後的人物 / 動作目錄、中文名稱正反查詢與預覽圖索引以 pickle 保存在 catalog.snapshot，
+來源檔（custom_character.json、custom_action.json、zh_TW.json、output_N.json、previews.pack）未變動時直接載入，
+不必再解析 JSON 與重建目錄；任一來源變動時自動重建
+快照只從插件資料夾讀取，內容由本模組自己寫出
+"""
+import gc
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+from charselect.catalog import ActionCatalog, CharacterCatalog
+from charselect.previews import PACK_FILE, JsonPreviewStore, PackPreviewStore, open_preview_store, shard_paths
+
+SNAPSHOT_FILE = "catalog.snapshot"
+SNAPSHOT_VERSION = 1
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def source_entry(path, digest=True):
+    """[檔名, 大小, 修改時間, sha256]，檔案不存在時大小與修改時間為 -1"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return [os.path.basename(path), -1, -1, None]
+    return [os.path.basename(path), st.st_size, st.st_mtime_ns, file_hash(path) if digest else None]
+
+
+def check_sources(paths, recorded):
+    """
+    比對來源檔與快照記錄
+    大小與修改時間相同即視為未變動；只有修改時間不同（例如重新 checkout）時再比對 sha256
+    Returns:
+    tuple: (是否有效, 更新修改時間後的記錄；沒有檔案只改了修改時間時為 None)
+    """
+    if len(paths) != len(recorded):
+        return False, None
+    refreshed = []
+    touched = False
+    for path, (name, size, mtime, digest) in zip(paths, recorded):
+        current = source_entry(path, digest=False)
+        if current[0] != name or current[1] != size:
+            return False, None
+        if current[2] != mtime:
+            if size < 0 or file_hash(path) != digest:
+                return False, None
+            touched = True
+        refreshed.append([name, size, current[2], digest])
+    return True, refreshed if touched else None
+
+
+def load_snapshot(path, sources):
+    """
+    讀取快照；不存在、版本不符、來源變動或無法讀取時回傳 None
+    檔案內依序為兩個 pickle：標頭（版本與來源記錄）與內容，來源變動時不必解開內容
+    """
+    try:
+        with open(path, "rb") as f:
+            header = pickle.load(f)
+            if header.get("version") != SNAPSHOT_VERSION:
+                return None
+            valid, refreshed = check_sources(sources, header.get("sources", []))
+            if not valid:
+                return None
+            #大量小物件一次建立，暫停循環垃圾回收避免載入途中反覆掃描
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                payload = pickle.load(f)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"錯誤：啟動快照 '{path}' 無法讀取 - {str(e)}")
+        return None
+    if refreshed is not None:
+        save_snapshot(path, sources, payload, refreshed)
+    return payload
+
+
+def save_snapshot(path, sources, payload, recorded=None):
+    """
+    以原子方式寫入快照
+    Parameters:
+    sources (list): 來源檔路徑
+    payload (dict): 快照內容
+    recorded (list): 已取得的來源記錄，None 時重新計算
+    """
+    header = {"version": SNAPSHOT_VERSION, "sources": recorded or [source_entry(p) for p in sources]}
+    tmp_path = None
+    try:
+        #暫存檔名不固定：兩個實例同時寫入時不會覆蓋或搬走對方的暫存檔
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                        dir=os.path.dirname(os.path.abspath(path)))
+        with open(fd, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"錯誤：啟動快照 '{path}' 無法寫入 - {str(e)}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError as e:
+        print(f"{e}\n{path} not found, check if it exists or if you have moved it.")
+        return {}
+
+
+def open_catalogs(basedir, character_file="custom_character.json", action_file="custom_action.json",
+                  localization_file="zh_TW.json", snapshot=True):
+    """
+    開啟人物目錄、動作目錄與預覽圖庫，快照有效時直接載入
+    Parameters:
+    basedir (str): 插件資料夾
+    snapshot (bool): 是否使用並更新啟動快照
+    Returns:
+    tuple: (CharacterCatalog, ActionCatalog, 預覽圖庫)
+    """
+    paths = shard_paths(basedir)
+    pack_path = os.path.join(basedir, PACK_FILE)
+    files = [os.path.join(basedir, name) for name in (character_file, action_file, localization_file)]
+    sources = files + paths + [pack_path]
+    snapshot_path = os.path.join(basedir, SNAPSHOT_FILE)
+
+    if snapshot:
+        payload = load_snapshot(snapshot_path, sources)
+        if payload is not None:
+            try:
+                kind, index = payload["preview"]
+                store = PackPreviewStore(pack_path, index) if kind == "pack" else JsonPreviewStore(paths, index)
+                return payload["characters"], payload["actions"], store
+            except Exception as e:
+                print(f"錯誤：啟動快照 '{snapshot_path}' 無法使用 - {str(e)}")
+
+    #預覽包可能在這裡重新產生，來源記錄要在之後、讀取 JSON 之前取得，讀取期間的變動會在下次啟動時發現
+    store = open_preview_store(basedir)
+    recorded = [source_entry(path) for path in sources] if snapshot else None
+    characters = CharacterCatalog(_read_json(files[0]), store.names(), _read_json(files[2]))
+    actions = ActionCatalog(_read_json(files[1]))
+    if snapshot:
+        kind = "pack" if isinstance(store, PackPreviewStore) else "json"
+        save_snapshot(snapshot_path, sources,
+                      {"characters": characters, "actions": actions, "preview": (kind, store.index)}, recorded)
+    return characters, actions, store
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="產生或檢查啟動快照")
+    parser.add_argument("--basedir", default=".", help="插件資料夾")
+    parser.add_argument("--rebuild", action="store_true", help="刪除現有快照後重新產生")
+    args = parser.parse_args()
+
+    snapshot_path = os.path.join(args.basedir, SNAPSHOT_FILE)
+    if args.rebuild and os.path.exists(snapshot_path):
+        os.remove(snapshot_path)
+    start = time.perf_counter()
+    characters, actions, store = open_catalogs(args.basedir)
+    print(f"人物 {len(characters)}，動作 {len(actions)}，預覽圖 {len(store)}（{type(store).__name__}），"
+          f"耗時 {(time.perf_counter() - start) * 1000:.1f} ms，快照 {os.path.getsize(snapshot_path)} bytes")
@@ -0,0 +1,93 @@
+"""
+啟動時的背景預熱：目錄載入、較重的模組匯入等工作在獨立的執行緒池並行執行，
+WebUI 不必等待；處理函式以 ready() / wait() 確認必要的工作已完成
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class Warmup:
+    """
+    背景預熱工作
+    使用自己的執行緒池，不與處理函式的 WorkerPool 共用：處理函式在 WorkerPool 中等待預熱時，預熱工作不會排在它們後面
+    Parameters:
+    max_workers (int): 同時執行的預熱工作數
+    """
+
+    def __init__(self, max_workers=4):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="charselect-warmup")
+        self.tasks = {}
+        self._required = []
+        self._lock = threading.Lock()
+
+    def submit(self, name, fn, *args, required=True):
+        """
+        在背景執行 fn(*args)
+        Parameters:
+        required (bool): 是否為處理函式必須等待的工作；非必要的工作失敗時不影響 ready()
+        Returns:
+        Future
+        """
+        task = {"state": "pending", "seconds": None, "error": None, "required": required}
+
+        def run():
+            task["state"] = "running"
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            except Exception as e:
+                task["error"] = str(e)
+                if required:
+                    print(f"錯誤：背景載入 '{name}' 失敗 - {task['error']}")
+                raise
+            finally:
+                task["seconds"] = round(time.perf_counter() - start, 3)
+                task["state"] = "failed" if task["error"] is not None else "done"
+
+        with self._lock:
+            self.tasks[name] = task
+            future = self.executor.submit(run)
+            if required:
+                self._required.append(future)
+        return future
+
+    def _futures(self, futures):
+        if futures is not None:
+            return list(futures)
+        with self._lock:
+            return list(self._required)
+
+    def ready(self, futures=None):
+        """必要的工作（或指定的 futures）是否都已成功完成"""
+        return all(f.done() and f.exception() is None for f in self._futures(futures))
+
+    def failed(self, futures=None):
+        """必要的工作（或指定的 futures）中是否有失敗的"""
+        return any(f.done() and f.exception() is not None for f in self._futures(futures))
+
+    def wait(self, timeout=None, futures=None):
+        """等待必要的工作（或指定的 futures）完成，最多 timeout 秒；回傳是否已就緒"""
+        futures = self._futures(futures)
+        wait(futures, timeout)
+        return self.ready(futures)
+
+    async def wait_async(self, timeout=None, futures=None):
+        """wait() 的 async 版本，等待時不佔用事件迴圈"""
+        futures = self._futures(futures)
+        pending = [asyncio.wrap_future(f) for f in futures if not f.done()]
+        for future in pending:
+            #失敗由 ready() / failed() 回報，這裡取出例外，避免 asyncio 警告例外未被讀取
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+        return self.ready(futures)
+
+    def status(self):
+        """各工作的狀態（pending / running / done / failed）、耗時與錯誤訊息"""
+        with self._lock:
+            return {name: dict(task) for name, task in self.tasks.items()}
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,101 @@
+"""
+處理函式的背景工作：CPU / IO 密集的工作（預覽圖解碼、AI 請求、目錄重新載入）交給有上限的執行緒池，
+不佔用 Gradio 的事件迴圈，並分別記錄每種工作的排隊時間與執行時間
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TimingStats:
+    """一種工作的排隊 / 執行時間統計，百分位數取最近 window 筆（執行緒安全）"""
+
+    def __init__(self, window=256):
+        self.count = 0
+        self.errors = 0
+        self.wait_total = 0.0
+        self.run_total = 0.0
+        self._waits = deque(maxlen=window)
+        self._runs = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, wait, run, error=False):
+        with self._lock:
+            self.count += 1
+            self.errors += bool(error)
+            self.wait_total += wait
+            self.run_total += run
+            self._waits.append(wait)
+            self._runs.append(run)
+
+    def snapshot(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            runs = sorted(self._runs)
+            count, errors, wait_total, run_total = self.count, self.errors, self.wait_total, self.run_total
+
+        def percentile(values, p):
+            return values[min(len(values) - 1, int(p * len(values)))] if values else None
+
+        return {
+            "count": count,
+            "errors": errors,
+            "wait_mean": wait_total / count if count else None,
+            "wait_p95": percentile(waits, 0.95),
+            "run_mean": run_total / count if count else None,
+            "run_p95": percentile(runs, 0.95),
+        }
+
+
+class WorkerPool:
+    """
+    有上限的執行緒池
+    Parameters:
+    max_workers (int): 同時執行的工作數上限，超過的工作排隊等待
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="charselect")
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, name):
+        stats = self.timings.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self.timings.setdefault(name, TimingStats())
+        return stats
+
+    def _timed(self, name, fn, args):
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            error = True
+            try:
+                result = fn(*args)
+                error = False
+                return result
+            finally:
+                self._stats(name).record(started - submitted, time.perf_counter() - started, error)
+
+        return task
+
+    async def run(self, name, fn, *args):
+        """在執行緒池執行 fn(*args) 並等待結果，事件迴圈在等待期間可處理其他請求"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._timed(name, fn, args))
+
+    def submit(self, name, fn, *args):
+        """在執行緒池執行 fn(*args)，回傳 Future（給非 async 的呼叫端或背景工作）"""
+        return self.executor.submit(self._timed(name, fn, args))
+
+    def stats(self):
+        """各工作名稱的排隊 / 執行時間統計（秒）"""
+        return {name: stats.snapshot() for name, stats in sorted(self.timings.items())}
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait)
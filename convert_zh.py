@@ -2,86 +2,193 @@
 # -*- coding: utf-8 -*-
 """
 繁体中文转简体中文转换器
-将zh_TW.json中的繁体字转换为简体字
+将zh_TW.json中的繁体角色名称转换为其他中文写法（默认简体 zh_CN.json）
+
+增量转换：转换结果记录在 zh_convert_manifest.json，只转换新增或改动的键；
+键很多时分给多个进程并行转换，输出文件以原子方式写入，一次可输出多个目标
+
+用法：
+python convert_zh.py                                  # zh_TW.json → zh_CN.json
+python convert_zh.py --target zh_CN=t2s --target zh_HK=t2hk
+python convert_zh.py --backup                         # 转换前备份 zh_TW.json
 
 依赖安装：
 pip install opencc-python-reimplemented
 """
 
+import argparse
+import hashlib
 import json
 import os
-from opencc import OpenCC
-
-def convert_tw_to_cn():
-    """将zh_TW.json转换为简体中文"""
-    
-    # 文件路径
-    input_file = 'zh_TW.json'
-    output_file = 'zh_CN.json'
-    
-    # 检查输入文件
-    if not os.path.exists(input_file):
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+MANIFEST_VERSION = 1
+DEFAULT_TARGETS = ['zh_CN=t2s']
+# 待转换的键少于这个数量时不开进程池
+PARALLEL_THRESHOLD = 2000
+CHUNK_SIZE = 500
+
+_converters = {}
+
+
+def load_json(path, default=None):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def write_json_atomic(path, obj, indent=2):
+    """先写到临时文件再替换，中断时不会留下写了一半的文件"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def items_hash(data):
+    """键、值与顺序的哈希，任何一项改变都会不同"""
+    return hashlib.sha256(json.dumps(list(data.items()), ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def convert_chunk(config, keys):
+    """在（子）进程中转换一批键，每个进程只建立一次 OpenCC"""
+    cc = _converters.get(config)
+    if cc is None:
+        from opencc import OpenCC
+        cc = _converters[config] = OpenCC(config)
+    return [cc.convert(key) for key in keys]
+
+
+def convert_keys(config, keys, jobs):
+    """转换 keys，数量多时分批交给进程池"""
+    if len(keys) < PARALLEL_THRESHOLD or jobs <= 1:
+        return convert_chunk(config, keys)
+    chunks = [keys[i:i + CHUNK_SIZE] for i in range(0, len(keys), CHUNK_SIZE)]
+    converted = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for result in pool.map(convert_chunk, [config] * len(chunks), chunks):
+            converted.extend(result)
+    return converted
+
+
+def convert_target(source, locale, config, state, output_dir, jobs, force):
+    """
+    增量转换一个目标
+    state 为清单中这个目标的记录 {config, source_hash, output_hash, keys: {原键: 转换后的键}}，会就地更新
+    keys 只用来跳过已转换过的键；输入的值或顺序有变化时（source_hash 不同）也会重写输出
+    返回统计信息
+    """
+    output_file = os.path.join(output_dir, f'{locale}.json')
+    if force or state.get('config') != config:
+        state.clear()
+    cached = state.setdefault('keys', {})
+    state['config'] = config
+
+    pending = [key for key in source if key not in cached]
+    removed = [key for key in cached if key not in source]
+    for key in removed:
+        del cached[key]
+    if pending:
+        cached.update(zip(pending, convert_keys(config, pending, jobs)))
+
+    # 输入的值或顺序改变、输出被手动改过或不存在时也要重写
+    source_hash = items_hash(source)
+    output_ok = os.path.exists(output_file) and state.get('output_hash') == file_hash(output_file)
+    written = False
+    if pending or removed or state.get('source_hash') != source_hash or not output_ok:
+        # 值保持不变（通常是英文提示词）
+        write_json_atomic(output_file, {cached[key]: value for key, value in source.items()})
+        state['source_hash'] = source_hash
+        state['output_hash'] = file_hash(output_file)
+        written = True
+
+    return {
+        'locale': locale,
+        'output': output_file,
+        'total': len(source),
+        'converted': len(pending),
+        'reused': len(source) - len(pending),
+        'removed': len(removed),
+        'changed': sum(1 for key in source if cached[key] != key),
+        'written': written,
+    }
+
+
+def convert_tw_to_cn(input_file='zh_TW.json', targets=DEFAULT_TARGETS, manifest_file='zh_convert_manifest.json',
+                     jobs=None, force=False):
+    """将 input_file 转换为各个目标，返回每个目标的统计信息"""
+    tw_data = load_json(input_file)
+    if tw_data is None:
         print(f"❌ 文件 {input_file} 不存在")
-        return
-    
+        return []
+
+    manifest = load_json(manifest_file, {})
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('source') != os.path.basename(input_file):
+        manifest = {'version': MANIFEST_VERSION, 'source': os.path.basename(input_file), 'targets': {}}
+    output_dir = os.path.dirname(os.path.abspath(input_file))
+    jobs = jobs or os.cpu_count() or 1
+
+    results = []
+    for target in targets:
+        locale, _, config = target.partition('=')
+        state = manifest['targets'].setdefault(locale, {})
+        results.append(convert_target(tw_data, locale, config or 't2s', state, output_dir, jobs, force))
+    write_json_atomic(manifest_file, manifest, indent=None)
+    return results
+
+
+def backup_original(input_file='zh_TW.json'):
+    """备份原始文件"""
+    import shutil
+    from datetime import datetime
+
+    backup_name = f'{os.path.splitext(input_file)[0]}_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+    shutil.copy2(input_file, backup_name)
+    print(f"💾 已备份原始文件到: {backup_name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='繁体中文角色名称转换')
+    parser.add_argument('--input', default='zh_TW.json', help='繁体中文数据文件')
+    parser.add_argument('--target', action='append', default=None,
+                        help='输出目标 <语言>=<OpenCC 配置>，可重复指定，默认 zh_CN=t2s（例：zh_HK=t2hk）')
+    parser.add_argument('--manifest', default='zh_convert_manifest.json', help='增量转换清单')
+    parser.add_argument('--jobs', type=int, default=None, help='进程数，默认为 CPU 核心数')
+    parser.add_argument('--force', action='store_true', help='忽略清单，全部重新转换')
+    parser.add_argument('--backup', action='store_true', help='转换前备份输入文件')
+    args = parser.parse_args()
+
+    print("🚀 开始繁体转简体转换...")
+    if args.backup and os.path.exists(args.input):
+        backup_original(args.input)
+
+    start = time.perf_counter()
     try:
-        # 初始化OpenCC转换器（繁体转简体）
-        cc = OpenCC('t2s')  # Traditional Chinese to Simplified Chinese
-        
-        # 读取繁体JSON文件
-        print("📖 正在读取繁体中文数据...")
-        with open(input_file, 'r', encoding='utf-8') as f:
-            tw_data = json.load(f)
-        
-        # 转换键名为简体
-        cn_data = {}
-        converted_count = 0
-        
-        print("🔄 正在转换繁体为简体...")
-        for traditional_key, value in tw_data.items():
-            # 转换键名（角色名称）
-            simplified_key = cc.convert(traditional_key)
-            
-            # 值保持不变（通常是英文提示词）
-            cn_data[simplified_key] = value
-            
-            if traditional_key != simplified_key:
-                converted_count += 1
-                print(f"   转换: {traditional_key} → {simplified_key}")
-        
-        # 写入简体JSON文件
-        print(f"💾 正在保存简体中文数据...")
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(cn_data, f, ensure_ascii=False, indent=2)
-        
-        print(f"✅ 转换完成！")
-        print(f"📊 总共转换了 {converted_count} 个字符")
-        print(f"📄 输出文件: {output_file}")
-        
-        # 显示文件大小对比
-        tw_size = os.path.getsize(input_file)
-        cn_size = os.path.getsize(output_file)
-        print(f"📏 文件大小: {tw_size} bytes → {cn_size} bytes")
-        
+        results = convert_tw_to_cn(args.input, args.target or DEFAULT_TARGETS, args.manifest, args.jobs, args.force)
     except ImportError:
         print("❌ 请先安装OpenCC库: pip install opencc-python-reimplemented")
+        return
     except Exception as e:
         print(f"❌ 转换过程中出现错误: {e}")
+        return
+
+    for r in results:
+        status = '已更新' if r['written'] else '无变化'
+        print(f"📄 {r['output']}（{status}）: 共 {r['total']} 个键，新转换 {r['converted']}，"
+              f"沿用 {r['reused']}，删除 {r['removed']}，写法不同 {r['changed']}")
+    print(f"✅ 转换完成！耗时 {time.perf_counter() - start:.2f}s")
 
-def backup_original():
-    """备份原始文件"""
-    import shutil
-    from datetime import datetime
-    
-    backup_name = f'zh_TW_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
-    shutil.copy2('zh_TW.json', backup_name)
-    print(f"💾 已备份原始文件到: {backup_name}")
 
 if __name__ == "__main__":
-    print("🚀 开始繁体转简体转换...")
-    
-    # 可选：备份原始文件
-    backup_original()
-    
-    # 执行转换
-    convert_tw_to_cn()
\ No newline at end of file
+    main()
@@ -0,0 +1,6 @@
+#WebUI 載入擴充功能前會先執行 install.py：人物搜尋的拼音 / 拼音縮寫比對需要 pypinyin
+#（charselect.search 在匯入時檢查，因此必須在載入腳本前安裝）
+import launch
+
+if not launch.is_installed("pypinyin"):
+    launch.run_pip("install pypinyin", "requirements for CharacterSelect: pypinyin")
@@ -1,2 +1,2 @@
 start http://localhost:8888 
-python -m http.server 8888 --bind 0.0.0.0
\ No newline at end of file
+python server.py --port 8888 --host 0.0.0.0
\ No newline at end of file
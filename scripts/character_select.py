@@ -1,8 +1,9 @@
+import asyncio
 import base64
+import functools
 from cProfile import label
 import io
 import random
-from PIL import Image
 import gradio as gr
 import modules.sd_samplers
 import modules.scripts as scripts
@@ -10,14 +11,24 @@ from modules import shared
 import json
 import os
 import shutil
-import requests
-import textwrap
+import threading
+import time
 from pprint import pprint
 from modules.ui import gr_show
 from collections import namedtuple
 from pathlib import Path
 from urllib.parse import urlparse
-import time
+from charselect.aicache import CACHE_FILE, ResponseCache, StreamAborted, cache_key
+from charselect.aiclient import PRIME_DIRECTIVE, AIClient, AIRequestError, expansion_messages
+from charselect.cache import LRUCache, PreviewCache
+from charselect.catalog import ActionCatalog, CharacterCatalog
+from charselect.profiling import StartupProfiler
+from charselect.reload import ConfigWatcher
+from charselect.search import build_character_index, normalize
+from charselect.session import SessionState
+from charselect.snapshot import open_catalogs
+from charselect.warmup import Warmup
+from charselect.workers import WorkerPool
 
 
 #  *********     versioning     *****
@@ -41,8 +52,18 @@ except:
 class CharacterSelect(scripts.Script):
 
     BASEDIR = scripts.basedir()
+    #txt2img、img2img 兩個實例共用的目錄載入（依 BASEDIR 各一個 Future），只載入一次
+    shared_lock = threading.Lock()
+    shared_catalogs = {}
+    #所有實例共用的背景預熱與處理函式執行緒池，第一個實例建立，卸載腳本時關閉（shutdown_shared_pools）
+    shared_warmup = None
+    shared_workers = None
 
     def __init__(self, *args, **kwargs):
+        #啟動分析（設定環境變數 CHARSELECT_PROFILE=1 啟用）
+        profiler = StartupProfiler.from_env(os.path.join(CharacterSelect.BASEDIR, "startup_profile.jsonl"))
+        profiler.start("設定檔")
+
         # components that pass through after_components
         self.all_components = []
         
@@ -63,6 +84,12 @@ class CharacterSelect(scripts.Script):
         self.copy_json_file(self.settings_file,self.custom_settings_file)
         self.copy_json_file(self.character_file,self.custom_character_file)
         self.copy_json_file(self.action_file,self.custom_action_file)
+        #熱重新載入：先記下自訂設定檔目前的修改時間，之後的變動才會被偵測到
+        self.watcher = ConfigWatcher({
+            "settings": os.path.join(CharacterSelect.BASEDIR, self.custom_settings_file),
+            "character": os.path.join(CharacterSelect.BASEDIR, self.custom_character_file),
+            "action": os.path.join(CharacterSelect.BASEDIR, self.custom_action_file)
+        })
 
         try:
             self.settings = self.get_config2(self.custom_settings_file)
@@ -95,56 +122,45 @@ class CharacterSelect(scripts.Script):
         #    self.download_json(self.settings["wai_json_url2"], os.path.join(CharacterSelect.BASEDIR, "wai_character2.json"))
         #    print("角色檔2 下載完成")
 
-        self.hm_config_1_component = self.get_config2(self.hm_config_1)
         #for item in self.get_character(self.hm_config_7):
-        #    self.hm_config_1_component.update({item : item})
-        num_parts = 10
-        self.hm_config_1_img = []
-        for i in range(num_parts):            
-            for item in self.get_config2(f"output_{i+1}.json"):
-                self.hm_config_1_img.append(item)
-                #key = list(item.keys())[0]
-                #self.hm_config_1_component.update({key : key})
-
-        self.hm_config_1_img = sorted(self.hm_config_1_img, key=lambda x: list(x.keys())[0])
-        for item in self.hm_config_1_img:
-            key = list(item.keys())[0]
-            self.hm_config_1_component.update({key : key})
-
-        self.hm_config_2_component = self.get_config2(self.hm_config_2)
-
-        #self.hm_config_1_img = self.get_characterimg(self.hm_config_8)
-        #for item in self.get_characterimg(self.hm_config_8):
-        #    self.hm_config_1_img.append(item)
-        
+        #    hm_config_1_component.update({item : item})
         self.localizations = "zh_TW.json"
-        self.localizations_component = self.get_config2(self.localizations)
-        self.relocalizations_component = {value: key for key, value in self.localizations_component.items()}
-
-        self.hm1prompt = ""
-        self.hm2prompt = ""
-
-        #text value
-        self.hm1btntext = ""
-        self.hm2btntext = ""
-        self.hm3btntext = ""
-        self.hm4btntext = ""
-
-        self.locked1 = ""
-        self.locked2 = ""
-        self.locked3 = ""
-        self.locked4 = ""
-        #loading - 避免回跳
-        self.loading = 0
-
-        #隨機的face也要記下來 避免蓋掉
-        self.faceprompt = ""
-
-        self.allfuncprompt = ""
-
-        #前一次的 cprompt
-        self.oldcprompt=""
 
+        profiler.start("背景載入")
+        #人物、動作目錄與預覽圖庫在背景載入，WebUI 不必等待；載入完成前為空目錄，處理函式會先等待載入完成
+        self.characters = CharacterCatalog({}, [])
+        self.actions = ActionCatalog({})
+        self.preview_store = None
+        self.preview_cache = None
+        #背景載入用 warmup；預覽圖解碼、AI 請求等會阻塞的工作交給有上限的執行緒池 workers，不佔用事件迴圈
+        #兩者由 txt2img、img2img 兩個實例共用
+        self.warmup, self.workers = self.shared_pools()
+        #人物搜尋索引，第一次搜尋時才建立
+        self.search_index = None
+        self.search_lock = threading.Lock()
+        #自動完成：下拉選單只放少量選項，輸入搜尋字後才由後端回傳最符合的前 K 個（依查詢字串快取）
+        self.autocomplete_enabled = self.settings.get("autocomplete", True)
+        self.autocomplete_k = self.settings.get("autocomplete_k", 50)
+        self.autocomplete_cache = LRUCache(max_entries=self.settings.get("autocomplete_cache_entries", 1024))
+
+        #人物、動作、細節與提詞等互動狀態放在每個工作階段各自的 SessionState（gr.State）
+        #AI 擴充用的連線池，第一次擴充時才建立
+        self.ai_client = None
+        self.ai_client_key = None
+        self.ai_lock = threading.Lock()
+        #AI 擴充的回覆快取（ai_cache.sqlite3），第一次擴充時才開啟
+        self.ai_cache = None
+        #處理函式執行時依 reload_interval 秒輪詢自訂設定檔，有變動才在背景重新載入
+        self.hot_reload = self.settings.get("hot_reload", True)
+        self.watcher.interval = self.settings.get("reload_interval", 5)
+        self.reload_lock = threading.Lock()
+        self.catalog_future = self.shared_catalog_future()
+        #載入完成時就套用到本實例（並開始建立搜尋索引），不必等第一次操作
+        self.catalog_future.add_done_callback(lambda future: self.catalogs_ready())
+        #PIL、requests 第一次使用時才匯入，這裡先在背景匯入，第一次選人物或 AI 擴充時不必等待
+        self.warmup.submit("imports", self.warm_imports, required=False)
+
+        profiler.start("介面元件")
         self.elm_prfx = "characterselect"
         CharacterSelect.txt2img_neg_prompt_btn = gr.Button(
             value="使用預設值",
@@ -181,41 +197,17 @@ class CharacterSelect(scripts.Script):
         )
 
         #h_m 人物
-        CharacterSelect.txt2img_hm1_dropdown = gr.Dropdown(
+        #人物、中文人物、滑桿與動作選單的選項來自目錄，在 create_catalog_components 中建立
+        CharacterSelect.txt2img_hm1_search_txt = gr.Textbox(
             label="人物搜尋",
-            choices=list(self.hm_config_1_component.keys()),
-            render = False,
-            elem_id=f"{self.elm_prfx}_hm1_dd"
-        )
-
-        CharacterSelect.txt2img_hm1_slider = gr.Slider(
-            minimum = 0,
-            maximum = len(self.hm_config_1_component) - 1,
-            value = 0,
-            step = 1,
+            placeholder="輸入英文、中文、作品名稱或拼音縮寫",
             render = False,
-            elem_id=f"{self.elm_prfx}_hm1_slider"
+            elem_id=f"{self.elm_prfx}_hm1_search_txt"
         )
-
-        CharacterSelect.txt2img_hmzht_dropdown = gr.Dropdown(
-            label="中文人物搜尋",
-            choices=list(self.localizations_component.keys()),
-            render = False,
-            elem_id=f"{self.elm_prfx}_hmzht_dd"
-        )
-
         CharacterSelect.txt2img_hm1_img = gr.Image(
             width = 100
         )
 
-        #h_m 姿勢
-        CharacterSelect.txt2img_hm2_dropdown = gr.Dropdown(
-            label="動作",
-            choices=list(self.hm_config_2_component.keys()),
-            render = False,
-            elem_id=f"{self.elm_prfx}_hm2_dd"
-        )
-
         #功能性調節
         CharacterSelect.func00_chk =gr.Checkbox(
             label="NSFW",
@@ -270,8 +262,80 @@ class CharacterSelect(scripts.Script):
             render = False,
             elem_id=f"{self.elm_prfx}_cprompt_btn"
         )
+        #取消勾選時每次都重新擴充，取得不同結果
+        CharacterSelect.txt2img_cprompt_cache_chk = gr.Checkbox(
+            label="使用快取",
+            value=self.settings.get("ai_cache", True),
+            render = False,
+            container = False,
+            elem_id=f"{self.elm_prfx}_cprompt_cache_chk"
+        )
+        #立即重新載入自訂設定檔，並更新人物、動作選單
+        CharacterSelect.txt2img_reload_btn = gr.Button(
+            value="重新載入",
+            variant="primary",
+            render = False,
+            elem_id=f"{self.elm_prfx}_reload_btn",
+            min_width=100
+        )
+        #每個工作階段各自的互動狀態（SessionState），第一次事件時建立
+        CharacterSelect.txt2img_session_state = gr.State(None, render = False)
 
         self.input_prompt = CharacterSelect.txt2img_cprompt_txt
+
+        #WebUI 只等待到這裡；背景載入完成時才寫入紀錄，一併記下各背景工作（目錄、匯入、搜尋索引）的耗時
+        profiler.stop()
+        self.catalog_future.add_done_callback(
+            lambda future: profiler.finish(catalog_ready=self.catalogs_ready(), background=self.warmup.status())
+        )
+    
+    def create_catalog_components(self):
+        """
+        建立選項來自目錄的元件（人物、中文人物、滑桿、動作），在介面建立時才呼叫
+        不等待背景載入：尚未載入完成時先以空選項建立，使用者第一次點選選單時由 fill_choices 填入
+        """
+        if getattr(self, "catalog_components_created", False):
+            return
+        self.catalog_components_created = True
+        self.choices_filled = self.catalogs_ready()
+        if self.choices_filled:
+            #自動完成模式下只先放前 K 個（自訂人物在前），其餘由搜尋框取得；程式設定的值不必在選項內
+            initial_choices, initial_zh_choices = self.autocomplete_choices("")
+        else:
+            initial_choices, initial_zh_choices = [], []
+
+        CharacterSelect.txt2img_hm1_dropdown = gr.Dropdown(
+            label="人物搜尋" if not self.autocomplete_enabled else "人物",
+            choices=initial_choices,
+            allow_custom_value = self.autocomplete_enabled,
+            render = False,
+            elem_id=f"{self.elm_prfx}_hm1_dd"
+        )
+
+        CharacterSelect.txt2img_hm1_slider = gr.Slider(
+            minimum = 0,
+            maximum = max(1, len(self.characters) - 1),
+            value = 0,
+            step = 1,
+            render = False,
+            elem_id=f"{self.elm_prfx}_hm1_slider"
+        )
+
+        CharacterSelect.txt2img_hmzht_dropdown = gr.Dropdown(
+            label="中文人物搜尋" if not self.autocomplete_enabled else "中文人物",
+            choices=initial_zh_choices,
+            allow_custom_value = self.autocomplete_enabled,
+            render = False,
+            elem_id=f"{self.elm_prfx}_hmzht_dd"
+        )
+
+        #h_m 姿勢
+        CharacterSelect.txt2img_hm2_dropdown = gr.Dropdown(
+            label="動作",
+            choices=self.actions.names,
+            render = False,
+            elem_id=f"{self.elm_prfx}_hm2_dd"
+        )
     
     def fakeinit(self, *args, **kwargs):
         """
@@ -294,9 +358,14 @@ class CharacterSelect(scripts.Script):
         #if kwargs.get("elem_id") == "":#f"{'txt2img' if self.is_txt2img else 'img2img'}_progress_bar":
         #print(kwargs.get("label") == self.before_component_label, "TEST", kwargs.get("label"))
         #if kwargs.get("label") == self.before_component_label:
+        self.create_catalog_components()
+        CharacterSelect.txt2img_session_state.render()
         with gr.Row(equal_height = True):
             CharacterSelect.txt2img_neg_prompt_btn.render()
         with gr.Accordion(label="人物動作設定", open = True, elem_id=f"{'txt2img' if self.is_txt2img else 'img2img'}_preset_manager_accordion"):
+            if self.autocomplete_enabled:
+                with gr.Row(equal_height = True):
+                    CharacterSelect.txt2img_hm1_search_txt.render()
             with gr.Row(equal_height = True):
                 CharacterSelect.txt2img_hm1_dropdown.render() 
             with gr.Row(equal_height = True):
@@ -318,11 +387,14 @@ class CharacterSelect(scripts.Script):
                 CharacterSelect.func02_chk.render()
                 CharacterSelect.func03_chk.render() 
                 CharacterSelect.func04_chk.render()
+            with gr.Row(equal_height = True):
+                CharacterSelect.txt2img_reload_btn.render()
         if(self.settings["ai"]):
             with gr.Row(equal_height = True):
                 CharacterSelect.txt2img_cprompt_txt.render()
                 with gr.Row(equal_height = True):
                     CharacterSelect.txt2img_cprompt_btn.render()    
+                    CharacterSelect.txt2img_cprompt_cache_chk.render()
 
     def after_component(self, component, **kwargs):
         if hasattr(component, "label") or hasattr(component, "elem_id"):
@@ -362,92 +434,143 @@ class CharacterSelect(scripts.Script):
     def _ui(self):
         # Conditional for class members
         if self.is_txt2img:
+            self.create_catalog_components()
+            state = CharacterSelect.txt2img_session_state
             #色色大師功能區
             CharacterSelect.txt2img_prompt_btn.click(
-                fn=self.fetch_valid_values_from_prompt,
-                outputs=self.prompt_component
+                fn=self.dispatch("fetch_valid_values_from_prompt", self.fetch_valid_values_from_prompt, catalog=False),
+                inputs=state,
+                outputs=[self.prompt_component, state]
             )
             CharacterSelect.txt2img_neg_prompt_btn.click(
-                fn=self.fetch_neg_prompt,
+                fn=self.dispatch("fetch_neg_prompt", self.fetch_neg_prompt, catalog=False),
                 outputs=[self.neg_prompt_component,self.steps_component,self.height_component,self.width_component,self.func00_chk,self.func01_chk,self.func03_chk,self.func04_chk]
             )
             #hm
             CharacterSelect.txt2img_hm1_dropdown.change(
                 fn=self.hm1_setting,
-                inputs=[CharacterSelect.txt2img_hm1_dropdown,self.prompt_component],
-                outputs=[CharacterSelect.txt2img_hm1_img, self.prompt_component,CharacterSelect.txt2img_hm1_slider,CharacterSelect.txt2img_hmzht_dropdown]
+                inputs=[CharacterSelect.txt2img_hm1_dropdown,self.prompt_component,state],
+                outputs=[CharacterSelect.txt2img_hm1_img, self.prompt_component,CharacterSelect.txt2img_hm1_slider,CharacterSelect.txt2img_hmzht_dropdown,state]
             )
+            if self.autocomplete_enabled:
+                CharacterSelect.txt2img_hm1_search_txt.change(
+                    fn=self.dispatch("autocomplete", self.autocomplete),
+                    inputs=[CharacterSelect.txt2img_hm1_search_txt, state],
+                    outputs=[CharacterSelect.txt2img_hm1_dropdown, CharacterSelect.txt2img_hmzht_dropdown, state]
+                )
+            if not self.choices_filled:
+                #建立介面時目錄尚未載入完成：第一次點選選單時等待載入並填入選項
+                fill_choices = self.dispatch("fill_choices", self.fill_choices)
+                for dropdown in (CharacterSelect.txt2img_hm1_dropdown, CharacterSelect.txt2img_hmzht_dropdown, CharacterSelect.txt2img_hm2_dropdown):
+                    dropdown.focus(
+                        fn=fill_choices,
+                        inputs=state,
+                        outputs=[CharacterSelect.txt2img_hm1_dropdown, CharacterSelect.txt2img_hmzht_dropdown, CharacterSelect.txt2img_hm1_slider, CharacterSelect.txt2img_hm2_dropdown, state]
+                    )
             CharacterSelect.txt2img_hmzht_dropdown.change(
-                fn=self.hmzht_setting,
-                inputs=[CharacterSelect.txt2img_hmzht_dropdown],
-                outputs=[CharacterSelect.txt2img_hm1_dropdown]
+                fn=self.dispatch("hmzht_setting", self.hmzht_setting),
+                inputs=[CharacterSelect.txt2img_hmzht_dropdown,state],
+                outputs=[CharacterSelect.txt2img_hm1_dropdown,state]
             )
             CharacterSelect.txt2img_hm1_slider.release(
-                fn=self.hm1_setting2,
-                inputs=[CharacterSelect.txt2img_hm1_slider,self.prompt_component],
-                outputs=[CharacterSelect.txt2img_hm1_dropdown]
+                fn=self.dispatch("hm1_setting2", self.hm1_setting2),
+                inputs=[CharacterSelect.txt2img_hm1_slider,self.prompt_component,state],
+                outputs=[CharacterSelect.txt2img_hm1_dropdown,state]
             )
             CharacterSelect.txt2img_hm2_dropdown.change(
-                fn=self.hm2_setting,
-                inputs=[CharacterSelect.txt2img_hm2_dropdown, self.prompt_component],
-                outputs=[CharacterSelect.txt2img_hm2_dropdown, self.prompt_component]
+                fn=self.dispatch("hm2_setting", self.hm2_setting),
+                inputs=[CharacterSelect.txt2img_hm2_dropdown, self.prompt_component, state],
+                outputs=[CharacterSelect.txt2img_hm2_dropdown, self.prompt_component, state]
             )
             
             #細節功能
-            detailinput = [self.prompt_component,CharacterSelect.func00_chk,CharacterSelect.func01_chk,CharacterSelect.func02_chk,CharacterSelect.func03_chk,CharacterSelect.func04_chk]
+            func_setting = self.dispatch("func_setting", self.func_setting, catalog=False)
+            detailinput = [self.prompt_component,CharacterSelect.func00_chk,CharacterSelect.func01_chk,CharacterSelect.func02_chk,CharacterSelect.func03_chk,CharacterSelect.func04_chk,state]
             CharacterSelect.func00_chk.change(
-                fn=self.func_setting,
+                fn=func_setting,
                 inputs=detailinput,
-                outputs=self.prompt_component
+                outputs=[self.prompt_component, state]
             )
             CharacterSelect.func01_chk.change(
-                fn=self.func_setting,
+                fn=func_setting,
                 inputs=detailinput,
-                outputs=self.prompt_component
+                outputs=[self.prompt_component, state]
             )
             CharacterSelect.func02_chk.change(
-                fn=self.func_setting,
+                fn=func_setting,
                 inputs=detailinput,
-                outputs=self.prompt_component
+                outputs=[self.prompt_component, state]
             )
             CharacterSelect.func03_chk.change(
-                fn=self.func_setting,
+                fn=func_setting,
                 inputs=detailinput,
-                outputs=self.prompt_component
+                outputs=[self.prompt_component, state]
             )
             CharacterSelect.func04_chk.change(
-                fn=self.func_setting,
+                fn=func_setting,
                 inputs=detailinput,
-                outputs=self.prompt_component
+                outputs=[self.prompt_component, state]
             )
             #鎖定
             #CharacterSelect.txt2img_lock1_btn.click(
             #    fn=self.prompt_lock1,
-            #    outputs=[CharacterSelect.txt2img_hm1_dropdown, CharacterSelect.txt2img_lock1_btn]
+            #    inputs=state,
+            #    outputs=[CharacterSelect.txt2img_hm1_dropdown, CharacterSelect.txt2img_lock1_btn, state]
             #) 
             #CharacterSelect.txt2img_lock2_btn.click(
             #    fn=self.prompt_lock2,
-            #    outputs=[CharacterSelect.txt2img_hm2_dropdown, CharacterSelect.txt2img_lock2_btn]
+            #    inputs=state,
+            #    outputs=[CharacterSelect.txt2img_hm2_dropdown, CharacterSelect.txt2img_lock2_btn, state]
             #)
             CharacterSelect.txt2img_radom_C_prompt_btn.click(
-                fn=self.h_m_random_C_prompt,
-                outputs=[self.prompt_component, CharacterSelect.txt2img_hm1_dropdown]
+                fn=self.dispatch("h_m_random_C_prompt", self.h_m_random_C_prompt),
+                inputs=[self.prompt_component, state],
+                outputs=[self.prompt_component, CharacterSelect.txt2img_hm1_dropdown, state]
             )
             CharacterSelect.txt2img_radom_A_prompt_btn.click(
-                fn=self.h_m_random_A_prompt,
-                outputs=[self.prompt_component,CharacterSelect.txt2img_hm2_dropdown]
+                fn=self.dispatch("h_m_random_A_prompt", self.h_m_random_A_prompt),
+                inputs=[self.prompt_component, state],
+                outputs=[self.prompt_component,CharacterSelect.txt2img_hm2_dropdown, state]
             )
             CharacterSelect.txt2img_radom_prompt_btn.click(
-                fn=self.h_m_random_prompt,
-                outputs=[self.prompt_component, CharacterSelect.txt2img_hm1_dropdown,CharacterSelect.txt2img_hm2_dropdown]
+                fn=self.dispatch("h_m_random_prompt", self.h_m_random_prompt),
+                inputs=[self.prompt_component, state],
+                outputs=[self.prompt_component, CharacterSelect.txt2img_hm1_dropdown,CharacterSelect.txt2img_hm2_dropdown, state]
+            )
+            CharacterSelect.txt2img_reload_btn.click(
+                fn=self.dispatch("reload_choices", self.reload_choices),
+                outputs=[CharacterSelect.txt2img_hm1_dropdown, CharacterSelect.txt2img_hmzht_dropdown, CharacterSelect.txt2img_hm1_slider, CharacterSelect.txt2img_hm2_dropdown]
             )
             CharacterSelect.txt2img_cprompt_btn.click(
                 fn=self.cprompt_send,
-                inputs=[self.prompt_component, self.input_prompt],
-                outputs=self.prompt_component
+                inputs=[self.prompt_component, self.input_prompt, CharacterSelect.txt2img_cprompt_cache_chk, state],
+                outputs=[self.prompt_component, state]
             )  
 
 
+    def dispatch(self, name, fn, catalog=True):
+        """
+        把同步的處理函式包成 async：實際工作交給執行緒池，並以 name 記錄排隊 / 執行時間
+        catalog 為 True 時先等待背景載入的目錄就緒
+        """
+        @functools.wraps(fn)
+        async def handler(*args):
+            if catalog:
+                await self.ensure_ready()
+            self.poll_reload()
+            return await self.workers.run(name, fn, *args)
+        return handler
+
+    async def ensure_ready(self):
+        """目錄尚在背景載入時等待（最多 warmup_timeout 秒）；逾時或載入失敗時以 gr.Error 告知使用者"""
+        if self.catalogs_ready():
+            return
+        await self.warmup.wait_async(self.settings.get("warmup_timeout", 30), [self.catalog_future])
+        if not self.catalogs_ready():
+            if self.catalog_future.done():
+                raise gr.Error("人物目錄載入失敗，請查看主控台的錯誤訊息")
+            raise gr.Error("人物目錄仍在載入中，請稍後再試")
+
     def f_b_syncer(self):
         """
         ?Front/Backend synchronizer?
@@ -512,248 +635,440 @@ class CharacterSelect(scripts.Script):
         return [{item["title"]:item["image"]} for item in as_dict["proj"]]
     
     #自訂提詞
-    def fetch_valid_values_from_prompt(self):
-        self.prompt_component.value = ""
-        self.prompt_component.value += self.hm1prompt
-        self.prompt_component.value += self.hm2prompt
-        self.prompt_component.value += self.allfuncprompt
-        return self.prompt_component.value
+    def fetch_valid_values_from_prompt(self, state=None):
+        #只留下人物、動作與細節
+        state = SessionState.ensure(state)
+        state.composer.clear("user", "ai")
+        return [state.composer.text(), state]
     
     #預設
     def fetch_neg_prompt(self):
-        self.neg_prompt_component.value = self.settings["neg_prompt"]
-        self.steps_component.value = self.settings["steps"]
-        self.height_component.value = self.settings["height"]
-        self.width_component.value = self.settings["width"]
-        return [self.neg_prompt_component.value,self.steps_component.value,self.height_component.value,self.width_component.value,True,True,True,True]
+        return [self.settings["neg_prompt"],self.settings["steps"],self.settings["height"],self.settings["width"],True,True,True,True]
     
 
     #隨機人
-    def h_m_random_C_prompt(self):
-        self.prompt_component.value = ""
-        self.hm1btntext = list(self.hm_config_1_component)[random.randint(1,len(self.hm_config_1_component)-1)]
-        self.prompt_component.value += self.hm_config_1_component[self.hm1btntext] + ","
-        self.prompt_component.value += self.hm2btntext + ","
-        self.prompt_component.value += self.allfuncprompt
+    def h_m_random_C_prompt(self, oldprompt=None, state=None):
+        state = SessionState.ensure(state)
+        state.composer.sync(oldprompt)
+        state.hm1btntext = self.characters.random_name()
+        state.composer.set("character", self.characters.prompt(state.hm1btntext))
 
-        return [self.prompt_component.value, self.hm1btntext]
+        return [state.composer.text(), state.hm1btntext, state]
 
     #隨機
-    def h_m_random_A_prompt(self):
-        self.prompt_component.value = ""
-        self.hm2btntext = list(self.hm_config_2_component)[random.randint(1,len(self.hm_config_2_component)-1)]
-        self.prompt_component.value += self.hm1btntext + ","
-        self.prompt_component.value += self.hm_config_2_component[self.hm2btntext] + ","
-        self.prompt_component.value += self.allfuncprompt
+    def h_m_random_A_prompt(self, oldprompt=None, state=None):
+        state = SessionState.ensure(state)
+        state.composer.sync(oldprompt)
+        state.hm2btntext = self.actions.random_name()
+        state.composer.set("action", self.actions.prompt(state.hm2btntext))
 
-        return [self.prompt_component.value, self.hm2btntext]
+        return [state.composer.text(), state.hm2btntext, state]
 
     #隨機
-    def h_m_random_prompt(self):
-        self.prompt_component.value = ""
-        self.hm1btntext = list(self.hm_config_1_component)[random.randint(1,len(self.hm_config_1_component)-1)]
-        self.hm2btntext = list(self.hm_config_2_component)[random.randint(1,len(self.hm_config_2_component)-1)]
-        self.prompt_component.value += self.hm_config_1_component[self.hm1btntext] + ","
-        self.prompt_component.value += self.hm_config_2_component[self.hm2btntext] + ","
-        self.prompt_component.value += self.allfuncprompt
-
-        return [self.prompt_component.value, self.hm1btntext, self.hm2btntext]
+    def h_m_random_prompt(self, oldprompt=None, state=None):
+        state = SessionState.ensure(state)
+        state.composer.sync(oldprompt)
+        state.hm1btntext = self.characters.random_name()
+        state.hm2btntext = self.actions.random_name()
+        state.composer.set("character", self.characters.prompt(state.hm1btntext))
+        state.composer.set("action", self.actions.prompt(state.hm2btntext))
+
+        return [state.composer.text(), state.hm1btntext, state.hm2btntext, state]
     
     #自訂1
-    async def hm1_setting(self, selection, oldprompt):
-        if(self.loading>=1):
-            return
-        self.loading = 1
+    async def hm1_setting(self, selection, oldprompt, state=None):
+        state = SessionState.ensure(state)
+        await self.ensure_ready()
+        self.poll_reload()
+        ticket = state.coalescer.begin("hm1")
         try:
             if(selection == ""):
                 selection = "random"
-            oldhmprompt = self.hm1prompt
-            self.hm1prompt = ""
-            btntext = ""
+
+            value = "data:image/jpeg;base64,/9j/4AAQSkZJRgABAQAAAQABAAD/2wCEAAkGBw4NDQ8NDRAQDg0ODQ0ODw0NDQ8PDw4NFREWFxgRFRUYHSggGBoxGxMVLTEhJSouOjouFyAzODM4NygvLysBCgoKDg0OGhAQGCslHiYrLS0tLS0tLS0tLS8uLS0tKystMC8rMy0tLS0tLy0tLS0rMC0tKystKy0tLS0tLS0tLf/AABEIAOEA4QMBEQACEQEDEQH/xAAbAAEAAgMBAQAAAAAAAAAAAAAAAwQCBgcFAf/EAD8QAAICAAIFBwkGBAcAAAAAAAABAgMEEQUGITFREhNBYXGBkQciIzJCUnKhsRRDgqLB0VNikvAkhLLC0uHx/8QAGgEBAAIDAQAAAAAAAAAAAAAAAAECAwQFBv/EAC0RAQACAgEDAgUDBQEBAAAAAAABAgMRBBIhMVFhBRMyQZFC0fAiUnGhsYEU/9oADAMBAAIRAxEAPwDuIAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAFDS2l6cJHOx5yfq1x2zl+y62ZcOC+WdVY8mWuOO7TdI60Yq7NVtUQ4V7Z5dcn+mR1MfCx1+rvLQvyr28dnhYiyyzbZOc3xnOUvqbda1r4iGCbTPmUEZTrecJSg+MJSi/kWmtZ8wRaY8S9PAa2Y3DtZz5+C3wu85909/1NfJwcV/Ean2Zqcm9fdu+gNZcPjvNj6O9LN0zazy4xftL+8jlZ+LfD58erexZq5PHl7ZrMwAAAAAAAAAAAAAAAAAAAAAAAAedpzSkcJTy/WslnGuHvS4vqRmwYZy219vuxZssY67c+usndN2WNynJ5uT+nUuo7daxSOmvhybWm07k5onaqOdROxWtgWiUqlkS8JV1OUJKcG4zi1KMovJxa6UyZiLRqUxOu8OoanaxfbqnCzJYmpLlpbFZHosS+q49qODzON8m248T/NOngzdcd/LYjUZwAAAAAAAAAAAAAAAAAAAAAABzvWHHPEYqbT8ytuqC6Mk9r73n3ZHb4uLoxx6z3cnkZOu/+FemBmmWusqnYU2ILoFokUrol4So2oyQlTtReEpdDaSlg8VViI55QllNL2qnslHw+aRjz4oy45r/ADbJjv0WiXa4SUkmnmmk01uaZ5l130AAAAAAAAAAAAAAAAAAAAACDHXc3TbZ7lVk/CLf6FqV6rRCtp1WZctpZ6KXFX6ZGOVVxWbCmhWukWiBQuZkhKjczJCVK0vCVWwsl2LU7EO3RuFk9rVSrz+BuH+083y69Oa0e7q4Z3jh7JrsoAAAAAAAAAAAAAAAAAAAACnpiDlhcRFb3h7ku3kMyYp1krPvCmSN0mPZy2qZ6GXGW67CkwhNzxGhHZaTECpbMvCVO2ReBUtZaEq1jLJh1zUOtx0Xhk+lWy7pWza+TPPc6d57fz7Opx41jhsBqMwAAAAAAAAAAAAAAAAAAAAD41msnuex9gHI8fh3hr7aJfdzcV1x3xfg14no8V/mUizjZK9NphjC0tpRnzpGhjK0nQgssLRArWTLQlWnIsIoVysnGuCznOUYQjxnJ5JeLJmYrEzK0Rt3PRuEWHoqojuqqhWnx5MUszyuS/XabT93XrXpiIWSqwAAAAAAAAAAAAAAAAAAAAABp+vmhXZFYypZzrjlbFb5VLdPu259XYdHgcjpn5dvE+GnysW46oaHGw7Gmgz5wjSGLsJ0lHKwnQgnMnQgnIlLdfJxoB2Wfb7V6OvNUJ+3Zuc+xbV29hzPiPJiI+VXz9/2bnGxbnrl0g4zeAAAAAAAAAAAAAAAAAAAAAAAADRNZ9TJZyvwKTTzc8NsWT41/wDHw4HV43O1/Tk/P7tLNxvvT8NHs5UJOE04yi8pRknGUXwae46sTExuGlMa7SwdhOkMJTJSjcs9i2ttJJb2+A8Gm4asaj23yjdjU6qdjVL2W29T9xfPs3nN5PxCtY6cfefVt4uPM97eHSqq4wioQSjGKUYxislGK2JJcDizMzO5b0RrszCQAAAAAAAAAAAAAAAAAAAAAAAAAUtI6Jw2KWWIqhZlsUpR85Lqktq7mZMeW+P6Z0pbHW3mHgYjyf4GTzjK+vqhYmvzJs26/Ec0edSwzxaMavJ7govOU8RPqlZBL8sUyZ+JZp8aRHEp7vc0ZoHB4TbRTCEssucacrMvjlmzVycjJk+qzNXFWviHpGFkAAAAAAAAAAAAAAAAAAAAAAAAAAANgedidO4SrZO+Ga3qDdjXdHMzV4+W3issVs1K+ZUZ634Nbucl1qvL6tGaODl9mOeXjfI634R7+dj21r9GJ4OX2P8A68a5h9YcFZsjfBPhZnX/AKkjFbjZa+aslc+O3iXpxkms0009zTzTMDK+gAAAAAAAAAAAAAAAAAAAAAAAHyTSWb2JbW3uSA1jS+uFdbcMKldNbOcefNJ9WW2Xd4m/h4Nrd79o/wBtTLyor2r3apjdJYjEv01kpL3F5sF+FbDo48GPH9MNK+W9/MoI1GTbEz5sbHx1jYinAlLPCY+/DvOiyVfVF+a+2L2MpfFTJ9UL1yWr4ltGiNdk2oYyKj0c9WnyfxR3rtXgc/N8PmO+Od+zcx8vfa7b6rYzipwkpQks4yi04tcU0c6YmJ1LciYnvDMhIAAAAAAAAAAAAAAAAAAAEeIvhVCVlklCEFnKT3JE1rNp1HlEzERuXOtYNYrMZJ1wzrwyeyG6VnXP9jtcfiVxRu3e3/HMzcib9o8PKrgbUy11mFZWZQnjWV2MnWNoRzgSlBYi0CtYi0JVbC0JX9Baw3YCfm+fS3nOlvY/5o+7L+2YORxa5o9J9WbFmtjn2dR0ZpCrFVRuplyoS8Yy6YyXQzg5Mdsdum3l06Xi0bhaKLAAAAAAAAAAAAAAAAAAA5vrXp14u3mqn/h65bMt1s17fZw8Tt8PjfLr1W8z/pzORm651Hh49UTblrLdUCkyhbrgUmULMKyux8nDICtai8CpaWhKray8JVLGXhKtYy0D0dWdPz0ffytsqJtK6tdMffS95f8AXZr8rjRmp7x4/Zmw5ZpPs7BTbGyEZwalCcVKMk81KLWaaPOzExOpdSJ33hmQkAAAAAAAAAAAAAAAAa1rxpX7Ph1TB5W4jOOa3xqXrP5pd74G7wcPXfqnxDW5OTprqPMufVI7UuYt1IpIt1IrKFyopKFlSSRVCC2ZMQlTtkXgVLZF4SqWyLwlVskWhKtYywrzZaFodC8mOmuXGeAse2tOylv+Hn50O5tP8T4HH+JYNTGSPv5bvFyfplvpym4AAAAAAAAAAAAAAAAOU60Y/wC0462SecK3zMPhg2n+blPvPQcTH8vFHv3crPfqvKjWZ5YFqspKFqtlRYhMrMIZO0jQhssLRArWTLRCVWyZaEqlki8JVrJFoFeciyUE2WhKzobSDwmKpxK+6sUpJdNb2SX9LZjz4/mY5p6rUt02iXeISUkpJ5ppNNdKfSeVdd9AAAAAAAAAAAAAAAqaVxXMYa67prqsmuuSi8l45F8VOu8V9ZVvbprMuOVv/wBPTOMs1srKFiEionjMrpCRWEaB2DQinYW0K9lhbSVayZaISr2TLCtORYQTkTELImywAdo1HxfP6Mw0n60IOl8fRycF8orxPM8ynRmtH/v5dPBbeOHumszAAAAAAAAAAAAAANf17t5Gjbst85VQ8bI5/JM2+DXeerByZ1jly+DO+5aeEiomjMrpCVTI0PvODQ+OwaEUrC2hDOwnSVecy0QIJzJEE5FoWRSZYfAAHUPJVc5YK6D9jFSa+GVcP1TOF8UrrLE+sN/iT/TMe7dTmtoAAAAAAAAAAAAAB4mueDlfo+6MFnKCjakt75ElJpdeSZs8O8UzVmWHPXqxy5NCR6JyksZFRIpkDNTGkHODQxdg0lHKwnQilMnQhnMslDKROkopMsPgAAB1byY4KVWBlbJZfaLpTjn/AA4pRT8Yy8TgfEskWzaj7Q6HFrqm/Vt5z2yAAAAAAAAAAAAAAAc+1n1LnGcr8EuVBtylh160H08jiv5fDguvxefGunJ+f3aObjTvdPw0xtxbi04yTycWmmnwa6GdONTG4acw+qY0hlywPjmNDFzJ0I5TCUcpkiKUi2ksGyR8AAfANw1Y1GuxMo24tSow+x8h5xutXDL2F1vbw4nN5PxCtI6cfef9Q2cXHm3e3aHU6q4wjGEEowjFRjGKyUYpZJJHDmZmdy34jTMhIAAAAAAAAAAAAAAAA83S2gsLjF6etOeWStj5ti/Et/YzNi5GTF9Msd8Vb+YahpHye2LN4W+Ml0QvTi/64rb4I6OP4nH66/hq24k/plr2M1Y0hT62HnJe9Vlan3RzfyNynMw2/V+WC2DJH2eTfCdeyyE63wshKD+ZnratvE7Y5iY8wh5zrL6QxcydJYOROhg5AZ01yseVcZTfCEXJ+CIm0V8yR38PVwerGkLsuRhbUn02R5pdvn5GvfmYaebR/wBZIw3nxDYdHeTe+WTxN0Ko+5UnZNrhm8kn4mnk+KVj6K7/AMs9eLafqluWhdVsFgspVV8q1ffWvl2dq6I9yRzc3Ly5fqnt6NmmGlPEPbNdlAAAAAAAAAAAAAAAAAAAAAAPjQFezAUT9emqXxVQf1RaL2jxMq9MeiB6DwT34XDPtw1X7F/n5P7p/Mo+XT0h8WgsCt2Ewy/y1X7D5+X+6fzJ8unpCevRuHh6tFMfhqgvois5Lz5tKemvosqKWxLJcEUWfQAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAH/2Q=="
+            index = self.characters.position(selection, 0)
+            image = await self.workers.run("hm1_setting.preview", self.load_preview, selection, value)
+
+            #已有更新的選擇，這次的結果作廢
+            if not state.coalescer.is_latest("hm1", ticket):
+                return [gr.update(), gr.update(), gr.update(), gr.update(), state]
+
+            state.composer.sync(oldprompt)
+            state.hm1prompt = ""
             #自行異動
-            if(self.hm1btntext != selection):
-                self.locked1 = ""
+            if(state.hm1btntext != selection):
+                state.locked1 = ""
                 if(selection != "random"):
-                    self.hm1prompt = selection + ","
-                    self.hm1btntext = selection
-            else:
-                if(selection != "random"):
-                    self.hm1prompt = selection + ","
-        
-            if(oldhmprompt!=""):
-                oldprompt = oldprompt.replace(", ",",").replace(oldhmprompt.replace(", ",","), self.hm1prompt)
-            else:
-                oldprompt += "," + self.hm1prompt
-        
-            value = "data:image/jpeg;base64,/9j/4AAQSkZJRgABAQAAAQABAAD/2wCEAAkGBw4NDQ8NDRAQDg0ODQ0ODw0NDQ8PDw4NFREWFxgRFRUYHSggGBoxGxMVLTEhJSouOjouFyAzODM4NygvLysBCgoKDg0OGhAQGCslHiYrLS0tLS0tLS0tLS8uLS0tKystMC8rMy0tLS0tLy0tLS0rMC0tKystKy0tLS0tLS0tLf/AABEIAOEA4QMBEQACEQEDEQH/xAAbAAEAAgMBAQAAAAAAAAAAAAAAAwQCBgcFAf/EAD8QAAICAAIFBwkGBAcAAAAAAAABAgMEEQUGITFREhNBYXGBkQciIzJCUnKhsRRDgqLB0VNikvAkhLLC0uHx/8QAGgEBAAIDAQAAAAAAAAAAAAAAAAECAwQFBv/EAC0RAQACAgEDAgUDBQEBAAAAAAABAgMRBBIhMVFhBRMyQZFC0fAiUnGhsYEU/9oADAMBAAIRAxEAPwDuIAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAFDS2l6cJHOx5yfq1x2zl+y62ZcOC+WdVY8mWuOO7TdI60Yq7NVtUQ4V7Z5dcn+mR1MfCx1+rvLQvyr28dnhYiyyzbZOc3xnOUvqbda1r4iGCbTPmUEZTrecJSg+MJSi/kWmtZ8wRaY8S9PAa2Y3DtZz5+C3wu85909/1NfJwcV/Ean2Zqcm9fdu+gNZcPjvNj6O9LN0zazy4xftL+8jlZ+LfD58erexZq5PHl7ZrMwAAAAAAAAAAAAAAAAAAAAAAAAedpzSkcJTy/WslnGuHvS4vqRmwYZy219vuxZssY67c+usndN2WNynJ5uT+nUuo7daxSOmvhybWm07k5onaqOdROxWtgWiUqlkS8JV1OUJKcG4zi1KMovJxa6UyZiLRqUxOu8OoanaxfbqnCzJYmpLlpbFZHosS+q49qODzON8m248T/NOngzdcd/LYjUZwAAAAAAAAAAAAAAAAAAAAAABzvWHHPEYqbT8ytuqC6Mk9r73n3ZHb4uLoxx6z3cnkZOu/+FemBmmWusqnYU2ILoFokUrol4So2oyQlTtReEpdDaSlg8VViI55QllNL2qnslHw+aRjz4oy45r/ADbJjv0WiXa4SUkmnmmk01uaZ5l130AAAAAAAAAAAAAAAAAAAAACDHXc3TbZ7lVk/CLf6FqV6rRCtp1WZctpZ6KXFX6ZGOVVxWbCmhWukWiBQuZkhKjczJCVK0vCVWwsl2LU7EO3RuFk9rVSrz+BuH+083y69Oa0e7q4Z3jh7JrsoAAAAAAAAAAAAAAAAAAAACnpiDlhcRFb3h7ku3kMyYp1krPvCmSN0mPZy2qZ6GXGW67CkwhNzxGhHZaTECpbMvCVO2ReBUtZaEq1jLJh1zUOtx0Xhk+lWy7pWza+TPPc6d57fz7Opx41jhsBqMwAAAAAAAAAAAAAAAAAAAAD41msnuex9gHI8fh3hr7aJfdzcV1x3xfg14no8V/mUizjZK9NphjC0tpRnzpGhjK0nQgssLRArWTLQlWnIsIoVysnGuCznOUYQjxnJ5JeLJmYrEzK0Rt3PRuEWHoqojuqqhWnx5MUszyuS/XabT93XrXpiIWSqwAAAAAAAAAAAAAAAAAAAAABp+vmhXZFYypZzrjlbFb5VLdPu259XYdHgcjpn5dvE+GnysW46oaHGw7Gmgz5wjSGLsJ0lHKwnQgnMnQgnIlLdfJxoB2Wfb7V6OvNUJ+3Zuc+xbV29hzPiPJiI+VXz9/2bnGxbnrl0g4zeAAAAAAAAAAAAAAAAAAAAAAAADRNZ9TJZyvwKTTzc8NsWT41/wDHw4HV43O1/Tk/P7tLNxvvT8NHs5UJOE04yi8pRknGUXwae46sTExuGlMa7SwdhOkMJTJSjcs9i2ttJJb2+A8Gm4asaj23yjdjU6qdjVL2W29T9xfPs3nN5PxCtY6cfefVt4uPM97eHSqq4wioQSjGKUYxislGK2JJcDizMzO5b0RrszCQAAAAAAAAAAAAAAAAAAAAAAAAAUtI6Jw2KWWIqhZlsUpR85Lqktq7mZMeW+P6Z0pbHW3mHgYjyf4GTzjK+vqhYmvzJs26/Ec0edSwzxaMavJ7govOU8RPqlZBL8sUyZ+JZp8aRHEp7vc0ZoHB4TbRTCEssucacrMvjlmzVycjJk+qzNXFWviHpGFkAAAAAAAAAAAAAAAAAAAAAAAAAAANgedidO4SrZO+Ga3qDdjXdHMzV4+W3issVs1K+ZUZ634Nbucl1qvL6tGaODl9mOeXjfI634R7+dj21r9GJ4OX2P8A68a5h9YcFZsjfBPhZnX/AKkjFbjZa+aslc+O3iXpxkms0009zTzTMDK+gAAAAAAAAAAAAAAAAAAAAAAAHyTSWb2JbW3uSA1jS+uFdbcMKldNbOcefNJ9WW2Xd4m/h4Nrd79o/wBtTLyor2r3apjdJYjEv01kpL3F5sF+FbDo48GPH9MNK+W9/MoI1GTbEz5sbHx1jYinAlLPCY+/DvOiyVfVF+a+2L2MpfFTJ9UL1yWr4ltGiNdk2oYyKj0c9WnyfxR3rtXgc/N8PmO+Od+zcx8vfa7b6rYzipwkpQks4yi04tcU0c6YmJ1LciYnvDMhIAAAAAAAAAAAAAAAAAAAEeIvhVCVlklCEFnKT3JE1rNp1HlEzERuXOtYNYrMZJ1wzrwyeyG6VnXP9jtcfiVxRu3e3/HMzcib9o8PKrgbUy11mFZWZQnjWV2MnWNoRzgSlBYi0CtYi0JVbC0JX9Baw3YCfm+fS3nOlvY/5o+7L+2YORxa5o9J9WbFmtjn2dR0ZpCrFVRuplyoS8Yy6YyXQzg5Mdsdum3l06Xi0bhaKLAAAAAAAAAAAAAAAAAAA5vrXp14u3mqn/h65bMt1s17fZw8Tt8PjfLr1W8z/pzORm651Hh49UTblrLdUCkyhbrgUmULMKyux8nDICtai8CpaWhKray8JVLGXhKtYy0D0dWdPz0ffytsqJtK6tdMffS95f8AXZr8rjRmp7x4/Zmw5ZpPs7BTbGyEZwalCcVKMk81KLWaaPOzExOpdSJ33hmQkAAAAAAAAAAAAAAAAa1rxpX7Ph1TB5W4jOOa3xqXrP5pd74G7wcPXfqnxDW5OTprqPMufVI7UuYt1IpIt1IrKFyopKFlSSRVCC2ZMQlTtkXgVLZF4SqWyLwlVskWhKtYywrzZaFodC8mOmuXGeAse2tOylv+Hn50O5tP8T4HH+JYNTGSPv5bvFyfplvpym4AAAAAAAAAAAAAAAAOU60Y/wC0462SecK3zMPhg2n+blPvPQcTH8vFHv3crPfqvKjWZ5YFqspKFqtlRYhMrMIZO0jQhssLRArWTLRCVWyZaEqlki8JVrJFoFeciyUE2WhKzobSDwmKpxK+6sUpJdNb2SX9LZjz4/mY5p6rUt02iXeISUkpJ5ppNNdKfSeVdd9AAAAAAAAAAAAAAAqaVxXMYa67prqsmuuSi8l45F8VOu8V9ZVvbprMuOVv/wBPTOMs1srKFiEionjMrpCRWEaB2DQinYW0K9lhbSVayZaISr2TLCtORYQTkTELImywAdo1HxfP6Mw0n60IOl8fRycF8orxPM8ynRmtH/v5dPBbeOHumszAAAAAAAAAAAAAANf17t5Gjbst85VQ8bI5/JM2+DXeerByZ1jly+DO+5aeEiomjMrpCVTI0PvODQ+OwaEUrC2hDOwnSVecy0QIJzJEE5FoWRSZYfAAHUPJVc5YK6D9jFSa+GVcP1TOF8UrrLE+sN/iT/TMe7dTmtoAAAAAAAAAAAAAB4mueDlfo+6MFnKCjakt75ElJpdeSZs8O8UzVmWHPXqxy5NCR6JyksZFRIpkDNTGkHODQxdg0lHKwnQilMnQhnMslDKROkopMsPgAAB1byY4KVWBlbJZfaLpTjn/AA4pRT8Yy8TgfEskWzaj7Q6HFrqm/Vt5z2yAAAAAAAAAAAAAAAc+1n1LnGcr8EuVBtylh160H08jiv5fDguvxefGunJ+f3aObjTvdPw0xtxbi04yTycWmmnwa6GdONTG4acw+qY0hlywPjmNDFzJ0I5TCUcpkiKUi2ksGyR8AAfANw1Y1GuxMo24tSow+x8h5xutXDL2F1vbw4nN5PxCtI6cfef9Q2cXHm3e3aHU6q4wjGEEowjFRjGKyUYpZJJHDmZmdy34jTMhIAAAAAAAAAAAAAAAA83S2gsLjF6etOeWStj5ti/Et/YzNi5GTF9Msd8Vb+YahpHye2LN4W+Ml0QvTi/64rb4I6OP4nH66/hq24k/plr2M1Y0hT62HnJe9Vlan3RzfyNynMw2/V+WC2DJH2eTfCdeyyE63wshKD+ZnratvE7Y5iY8wh5zrL6QxcydJYOROhg5AZ01yseVcZTfCEXJ+CIm0V8yR38PVwerGkLsuRhbUn02R5pdvn5GvfmYaebR/wBZIw3nxDYdHeTe+WTxN0Ko+5UnZNrhm8kn4mnk+KVj6K7/AMs9eLafqluWhdVsFgspVV8q1ffWvl2dq6I9yRzc3Ly5fqnt6NmmGlPEPbNdlAAAAAAAAAAAAAAAAAAAAAAPjQFezAUT9emqXxVQf1RaL2jxMq9MeiB6DwT34XDPtw1X7F/n5P7p/Mo+XT0h8WgsCt2Ewy/y1X7D5+X+6fzJ8unpCevRuHh6tFMfhqgvois5Lz5tKemvosqKWxLJcEUWfQAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAH/2Q=="
-            index = 0
-            i=0
-            for item in self.hm_config_1_img:
-                i+=1
-                if(item.get(selection,'') != ''):
-                    value = item.get(selection)
-                    index = i
-
-            #self.base64_to_pil(self.hm_config_1_img[0].get('hatsune miku'))
-        
-            return [self.base64_to_pil(value), oldprompt, index, self.relocalizations_component[self.hm1btntext]]
+                    state.hm1btntext = selection
+            if(selection != "random"):
+                state.hm1prompt = selection + ","
+            state.composer.set("character", state.hm1prompt)
+            oldprompt = state.composer.text()
+
+            zhtname = self.characters.localized(state.hm1btntext)
+            if zhtname is None:
+                return [image, oldprompt, index, gr.update(), state]
+            state.coalescer.emit("hmzht", zhtname)
+            return [image, oldprompt, index, zhtname, state]
         except:
-            return
-        finally:
-            time.sleep(0.5)
-            self.loading=0
+            return [gr.update(), gr.update(), gr.update(), gr.update(), state]
     
-    def hm1_setting2(self, selection, oldprompt):
-        if(self.loading>=1):
-            return
-        self.loading=1
-        try:
-            return list(self.hm_config_1_component.keys())[selection]
-        finally:
-            time.sleep(0.5)
-            self.loading=0
+    def load_preview(self, selection, fallback):
+        """解碼並縮小預覽圖，沒有預覽圖時解碼預設圖（在執行緒池中執行）"""
+        image = self.preview_cache.get(selection)
+        if image is None:
+            image = self.base64_to_pil(fallback)
+        return image
 
-    def hmzht_setting(self, selection, oldprompt):
-        if(self.loading>=1):
-            return
-        self.loading=1
-        try:
-            return self.localizations_component[selection]
-        finally:
-            time.sleep(0.5)
-            self.loading=0
+    def hm1_setting2(self, selection, oldprompt, state=None):
+        #只是查表、沒有等待，不加入 "hm1" 頻道（否則會讓進行中的 hm1_setting 作廢）；
+        #改變人物選單後由 hm1_setting 的合併處理
+        state = SessionState.ensure(state)
+        name = self.characters[int(selection)]
+        return [name, state]
+
+    def hmzht_setting(self, selection, state=None):
+        state = SessionState.ensure(state)
+        #hm1_setting 設定中文名稱時觸發的事件，不必再回頭改人物
+        if state.coalescer.is_echo("hmzht", selection):
+            return [gr.update(), state]
+        #與 hm1_setting2 相同，不加入 "hm1" 頻道
+        name = self.characters.from_localized(selection)
+        if name is None:
+            return [gr.update(), state]
+        return [name, state]
      
 
     #自訂2
-    def hm2_setting(self, selection, oldprompt):
+    def hm2_setting(self, selection, oldprompt, state=None):
+        state = SessionState.ensure(state)
         if(selection == ""):
             selection = "random"
-        oldhmprompt = self.hm2prompt
-        self.hm2prompt = ""
-        btntext = ""
+        state.composer.sync(oldprompt)
+        state.hm2prompt = ""
         #自行異動
-        if(self.hm2btntext != selection):
-            self.locked2 = ""
-            if(selection != "random"):
-                self.hm2prompt = self.hm_config_2_component[selection] + ","
-        else:
-            if(selection != "random"):
-                self.hm2prompt = self.hm_config_2_component[selection] + ","
-            
-        self.hm2btntext = selection
-        if(oldhmprompt!=""):
-            oldprompt = oldprompt.replace(oldhmprompt, self.hm2prompt)
-        else:
-            oldprompt += "," + self.hm2prompt
-        
-        return [selection, oldprompt]
+        if(state.hm2btntext != selection):
+            state.locked2 = ""
+        if(selection != "random"):
+            state.hm2prompt = self.actions.prompt(selection) + ","
+
+        state.hm2btntext = selection
+        state.composer.set("action", state.hm2prompt)
+        return [selection, state.composer.text(), state]
 
     #細節
-    def func_setting(self, oldprompt,fv0,fv1,fv2,fv3,fv4):
-        self.allfuncprompt = ""
-        oldprompt = oldprompt.replace(self.settings["nsfw"], "")
-        oldprompt = oldprompt.replace(self.settings["more_detail"], "")
-        oldprompt = oldprompt.replace(self.settings["less_detail"], "")
-        oldprompt = oldprompt.replace(self.settings["quality"], "")
-        oldprompt = oldprompt.replace(self.settings["character_enhance"], "")
+    def func_setting(self, oldprompt,fv0,fv1,fv2,fv3,fv4,state=None):
+        state = SessionState.ensure(state)
+        state.composer.sync(oldprompt)
+        state.allfuncprompt = ""
         if(fv0):
-            self.allfuncprompt += self.settings["nsfw"]
+            state.allfuncprompt += self.settings["nsfw"]
         if(fv1):
-            self.allfuncprompt += self.settings["more_detail"]
+            state.allfuncprompt += self.settings["more_detail"]
         if(fv2):
-            self.allfuncprompt += self.settings["less_detail"]
+            state.allfuncprompt += self.settings["less_detail"]
         if(fv3):
-            self.allfuncprompt += self.settings["quality"]
+            state.allfuncprompt += self.settings["quality"]
         if(fv4):
-            self.allfuncprompt += self.settings["character_enhance"]
-        oldprompt += self.allfuncprompt
-        return oldprompt
+            state.allfuncprompt += self.settings["character_enhance"]
+        state.composer.set("features", state.allfuncprompt)
+        return [state.composer.text(), state]
     
-    def prompt_lock1(self):
-        if(self.locked1 == ""):
-            self.locked1 = "Y"
-            self.hm1prompt = self.hm1btntext
-            try:
-                btntext = "鎖定:" + self.relocalizations_component[self.hm1btntext]
-            except:
-                btntext = "鎖定:" + self.hm1btntext
+    def prompt_lock1(self, state=None):
+        state = SessionState.ensure(state)
+        if(state.locked1 == ""):
+            state.locked1 = "Y"
+            state.hm1prompt = state.hm1btntext
+            btntext = "鎖定:" + self.characters.localized(state.hm1btntext, state.hm1btntext)
         else:
-            self.locked1 = ""
-            try:
-                btntext = self.relocalizations_component[self.hm1btntext]
-            except:
-                btntext = self.hm1btntext
-            self.hm1prompt = ""
-        return [self.hm1prompt, btntext]
+            state.locked1 = ""
+            btntext = self.characters.localized(state.hm1btntext, state.hm1btntext)
+            state.hm1prompt = ""
+        return [state.hm1prompt, btntext, state]
     
-    def prompt_lock2(self):
-        if(self.locked2 == ""):
-            self.locked2 = "Y"
-            self.hm2prompt = self.hm2btntext
-            try:
-                btntext = "鎖定:" + self.relocalizations_component[self.hm2btntext]
-            except:
-                btntext = "鎖定:" + self.hm2btntext
+    def prompt_lock2(self, state=None):
+        state = SessionState.ensure(state)
+        if(state.locked2 == ""):
+            state.locked2 = "Y"
+            state.hm2prompt = state.hm2btntext
+            btntext = "鎖定:" + self.characters.localized(state.hm2btntext, state.hm2btntext)
         else:
-            self.locked2 = ""
-            btntext = self.hm2prompt
-            self.hm2prompt = ""
-        return [self.hm2prompt, btntext]
+            state.locked2 = ""
+            btntext = state.hm2prompt
+            state.hm2prompt = ""
+        return [state.hm2prompt, btntext, state]
     
-    def cprompt_send(self, oldprompt, input_prompt):
-        generated_texts = []
-        generated_texts = self.send_request(input_prompt)
-        #clear beafore
-        oldprompt = oldprompt.replace(self.oldcprompt, '')
-        self.oldcprompt = ''
-        for text in generated_texts:
-            self.oldcprompt += text
-        self.oldcprompt = self.oldcprompt.replace(", ", ",") 
-        oldprompt = oldprompt + ',' + self.oldcprompt
-        print(f"llama3: {self.oldcprompt}")
-        return oldprompt
+    async def cprompt_send(self, oldprompt, input_prompt, use_cache=True, state=None):
+        #async generator：擴寫結果邊收邊更新提詞框，等待回應的部分在執行緒池中進行
+        state = SessionState.ensure(state)
+        state.composer.sync(oldprompt)
+        state.oldcprompt = ''
+        last = 0.0
+        sent = None
+        chunks = self.stream_request(input_prompt, use_cache=use_cache)
+        step = None
+        try:
+            while True:
+                step = self.workers.submit("cprompt_send.request", next, chunks, None)
+                text = await asyncio.wrap_future(step)
+                if text is None:
+                    break
+                state.oldcprompt += text
+                #取代前一次的擴寫結果
+                state.composer.set("ai", state.oldcprompt.replace(", ", ","))
+                #更新太頻繁只會塞住前端，最多每 50ms 送一次
+                now = time.perf_counter()
+                if now - last >= 0.05:
+                    last = now
+                    sent = state.composer.text()
+                    yield [sent, state]
+        finally:
+            #事件被取消時關閉上游串流（共用同一串流的其他呼叫會收到中斷）；
+            #執行緒池仍在讀取下一段時等它結束再關閉，同一個 generator 不能同時執行
+            if step is not None and not step.done():
+                step.add_done_callback(lambda future: chunks.close())
+            else:
+                chunks.close()
+        state.oldcprompt = state.oldcprompt.replace(", ", ",") 
+        state.composer.set("ai", state.oldcprompt)
+        if state.composer.text() != sent:
+            yield [state.composer.text(), state]
     
-    def send_request(self, input_prompt, **kwargs):
-        prime_directive = textwrap.dedent("""\
-            Act as a prompt maker with the following guidelines:               
-            - Break keywords by commas.
-            - Provide high-quality, non-verbose, coherent, brief, concise, and not superfluous prompts.
-            - Focus solely on the visual elements of the picture; avoid art commentaries or intentions.
-            - Construct the prompt with the component format:
-            1. Start with the subject and keyword description.
-            2. Follow with motion keyword description.
-            3. Follow with scene keyword description.
-            4. Finish with background and keyword description.
-            - Limit yourself to no more than 20 keywords per component  
-            - Include all the keywords from the user's request verbatim as the main subject of the response.
-            - Be varied and creative.
-            - Always reply on the same line and no more than 100 words long. 
-            - Do not enumerate or enunciate components.
-            - Create creative additional information in the response.    
-            - Response in English.
-            - Response prompt only.                                                
-            The followin is an illustartive example for you to see how to construct a prompt your prompts should follow this format but always coherent to the subject worldbuilding or setting and cosider the elemnts relationship.
-            Example:
-            Demon Hunter,Cyber City,A Demon Hunter,standing,lone figure,glow eyes,deep purple light,cybernetic exoskeleton,sleek,metallic,glowing blue accents,energy weapons,Fighting Demon,grotesque creature,twisted metal,glowing red eyes,sharp claws,towering structures,shrouded haze,shimmering energy,                            
-            Make a prompt for the following Subject:
-            """)
-        data = {
-                'model': self.settings["model"],
-                'messages': [
-                    {"role": "system", "content": prime_directive},
-                    {"role": "user", "content": input_prompt + ";Response in English"}
-                ],  
-            }
-        headers = kwargs.get('headers', {"Content-Type": "application/json", "Authorization": "Bearer " + self.settings["api_key"]})
-        base_url = self.settings["base_url"]
-        response = requests.post(base_url, headers=headers, json=data)
-
-        if response.status_code == 200:
-            return response.json().get('choices', [{}])[0].get('message', {}).get('content', '')
-        else:
-            print(f"Error: Request failed with status code {response.status_code}")
+    def send_request(self, input_prompt, use_cache=True, **kwargs):
+        client = self.get_ai_client()
+        fetch = lambda: client.complete(expansion_messages(input_prompt), headers=kwargs.get('headers'))
+        try:
+            cache = self.get_ai_cache() if use_cache else None
+            if cache is None:
+                return fetch()
+            return cache.fetch(cache_key(client.base_url, client.model, PRIME_DIRECTIVE, input_prompt), fetch)
+        except AIRequestError as e:
+            print(f"Error: {e}")
             return []
 
+    def stream_request(self, input_prompt, use_cache=True, **kwargs):
+        """
+        逐段產生 AI 擴充結果（設定 ai_stream 為 false 時整段一次產生）
+        快取命中時直接回傳快取內容；完整收到的串流結果會寫入快取，相同的擴充同時進行時共用一個串流
+        """
+        if not self.settings.get("ai_stream", True):
+            yield self.send_request(input_prompt, use_cache=use_cache, **kwargs) or ""
+            return
+        client = self.get_ai_client()
+        cache = self.get_ai_cache() if use_cache else None
+        open_stream = lambda: client.stream(expansion_messages(input_prompt), headers=kwargs.get('headers'))
+        try:
+            if cache is None:
+                yield from open_stream()
+            else:
+                #相同的擴充同時進行時只送出一個請求，其他呼叫共用它的串流片段
+                key = cache_key(client.base_url, client.model, PRIME_DIRECTIVE, input_prompt)
+                yield from cache.fetch_stream(key, open_stream, timeout=client.timeout[1])
+        except (AIRequestError, StreamAborted) as e:
+            print(f"Error: {e}")
+
+    def get_ai_cache(self):
+        """AI 擴充的回覆快取；設定 ai_cache 為 false 時不使用"""
+        #同時送出的第一批請求要拿到同一個快取，相同的請求才會合併
+        with self.ai_lock:
+            if self.ai_cache is None and self.settings.get("ai_cache", True):
+                try:
+                    self.ai_cache = ResponseCache(
+                        os.path.join(CharacterSelect.BASEDIR, CACHE_FILE),
+                        ttl=self.settings.get("ai_cache_ttl_hours", 168) * 3600,
+                        max_entries=self.settings.get("ai_cache_entries", 1000)
+                    )
+                except Exception as e:
+                    print(f"錯誤：AI 快取 '{CACHE_FILE}' 無法開啟 - {str(e)}")
+                    self.settings["ai_cache"] = False
+            return self.ai_cache
+
+    def get_ai_client(self):
+        """共用的 AI 用戶端，第一次擴充時才建立；base_url / 金鑰 / 模型變更時重建"""
+        key = (self.settings["base_url"], self.settings["api_key"], self.settings["model"])
+        with self.ai_lock:
+            if self.ai_client is None or self.ai_client_key != key:
+                if self.ai_client is not None:
+                    self.ai_client.close()
+                self.ai_client = AIClient.from_settings(self.settings)
+                self.ai_client_key = key
+            return self.ai_client
+
+    #背景載入
+    def shared_pools(self):
+        """回傳所有實例共用的 (Warmup, WorkerPool)，第一次呼叫時依設定建立"""
+        with CharacterSelect.shared_lock:
+            if CharacterSelect.shared_warmup is None:
+                CharacterSelect.shared_warmup = Warmup(self.settings.get("warmup_threads", 2))
+                CharacterSelect.shared_workers = WorkerPool(self.settings.get("worker_threads", 4))
+            return CharacterSelect.shared_warmup, CharacterSelect.shared_workers
+
+    def shared_catalog_future(self):
+        """同一個 BASEDIR 的目錄只在背景載入一次，所有實例共用同一個 Future；上一次載入失敗時重新載入"""
+        with CharacterSelect.shared_lock:
+            future = CharacterSelect.shared_catalogs.get(CharacterSelect.BASEDIR)
+            if future is None or (future.done() and future.exception() is not None):
+                future = self.warmup.submit("catalogs", self.load_catalogs)
+                CharacterSelect.shared_catalogs[CharacterSelect.BASEDIR] = future
+            return future
+
+    def catalogs_ready(self):
+        """目錄是否已可使用；共用的目錄第一次就緒時套用到本實例，並在背景先建好搜尋索引"""
+        if self.preview_store is not None:
+            return True
+        future = self.catalog_future
+        if not future.done() or future.exception() is not None:
+            return False
+        with self.reload_lock:
+            if self.preview_store is None:
+                self.characters, self.actions, preview_store, self.preview_cache = future.result()
+                #preview_store 最後設定，其他執行緒看到它時目錄都已套用
+                self.preview_store = preview_store
+                if self.autocomplete_enabled:
+                    #搜尋索引在背景先建好，第一次輸入不必等待
+                    self.warmup.submit("search_index", self.search_characters, "", 1, required=False)
+        return True
+
+    def wait_catalogs(self, timeout=None):
+        """同步等待目錄載入完成，回傳是否已可使用（給基準測試等非 async 的呼叫端）"""
+        self.warmup.wait(timeout, [self.catalog_future])
+        return self.catalogs_ready()
+
+    def load_catalogs(self):
+        """
+        載入人物、動作目錄與預覽圖庫（在 warmup 執行緒池中執行，結果由所有實例共用）
+        人物：自訂人物在前，其後為排序後的預覽圖人物；含中文名稱正反查詢
+        動作；預覽圖只建立索引，選到時才讀取（優先使用 previews.pack）
+        來源檔未變動時直接載入啟動快照（catalog.snapshot），不必解析 JSON
+        Returns:
+        tuple: (人物目錄, 動作目錄, 預覽圖庫, 預覽圖快取)
+        """
+        characters, actions, preview_store = open_catalogs(
+            CharacterSelect.BASEDIR,
+            self.hm_config_1,
+            self.hm_config_2,
+            self.localizations,
+            snapshot=self.settings.get("startup_snapshot", True)
+        )
+        #解碼後已縮小的預覽圖快取（預設寬 200，給 100 寬的顯示框留高解析度餘裕）
+        preview_cache = PreviewCache(
+            preview_store,
+            width=self.settings.get("preview_width", 200),
+            max_entries=self.settings.get("preview_cache_entries", 256),
+            max_bytes=self.settings.get("preview_cache_mb", 32) * 1024 * 1024
+        )
+        print(f"成功：人物目錄載入完成（{len(characters)} 個人物、{len(actions)} 個動作、{len(preview_store)} 張預覽圖）")
+        return characters, actions, preview_store, preview_cache
+
+    def warm_imports(self):
+        """預先匯入第一次使用時才匯入的模組"""
+        import PIL.Image
+        import requests
+
+    #人物搜尋
+    def search_characters(self, query, k=20):
+        """回傳最符合查詢的前 k 個人物名稱（英文提示詞、繁簡中文、作品名稱、拼音縮寫皆可）"""
+        #重新載入時 search_index 會被清掉，這裡只讀一次
+        index = self.search_index
+        if index is None:
+            with self.search_lock:
+                if self.search_index is None:
+                    extra = []
+                    if os.path.exists(os.path.join(CharacterSelect.BASEDIR, "zh_CN.json")):
+                        extra.append(self.get_config2("zh_CN.json"))
+                    self.search_index = build_character_index(self.characters, extra)
+                index = self.search_index
+        return [name for name, score in index.search(query, k)]
+
+    def autocomplete_choices(self, query):
+        """
+        下拉選單的選項：(人物名稱, 中文名稱)
+        關閉自動完成時為完整清單；查詢為空時為目錄前 K 筆，否則為搜尋結果前 K 筆
+        """
+        if not self.autocomplete_enabled:
+            return self.characters.names, self.characters.localized_names
+        key = normalize(query)
+        choices = self.autocomplete_cache.get(key)
+        if choices is None:
+            if key:
+                names = self.search_characters(query, self.autocomplete_k)
+            else:
+                names = self.characters.names[:self.autocomplete_k]
+            zh_names = [zh for zh in (self.characters.localized(name) for name in names) if zh is not None]
+            choices = (names, zh_names)
+            self.autocomplete_cache.put(key, choices)
+        return choices
+
+    def autocomplete(self, query, state=None):
+        """人物搜尋框：以最符合的前 K 個人物更新兩個下拉選單"""
+        state = SessionState.ensure(state)
+        ticket = state.coalescer.begin("autocomplete")
+        names, zh_names = self.autocomplete_choices(query)
+        state.choices_loaded = True
+        #輸入較快時，較早的查詢結果不再覆蓋較新的
+        if not state.coalescer.is_latest("autocomplete", ticket):
+            return [gr.update(), gr.update(), state]
+        return [gr.update(choices=names), gr.update(choices=zh_names), state]
+
+    #熱重新載入
+    def poll_reload(self):
+        """到了輪詢時間就在背景檢查自訂設定檔，不等待結果"""
+        if self.hot_reload and self.catalogs_ready() and self.watcher.due():
+            self.workers.submit("reload", self.reload_custom)
+
+    def reload_custom(self):
+        """
+        重新載入有變動的 custom_settings.json / custom_character.json / custom_action.json
+        JSON 無效的檔案繼續使用上一個版本；目錄以新物件替換，正在執行的處理函式仍使用原本的目錄
+        Returns:
+        dict: 有變動且有效的 {名稱: 新內容}
+        """
+        with self.reload_lock:
+            changed = self.watcher.poll()
+            if "settings" in changed:
+                self.settings = changed["settings"]
+                self.hot_reload = self.settings.get("hot_reload", True)
+                self.watcher.interval = self.settings.get("reload_interval", 5)
+                print(f"成功：已重新載入 '{self.custom_settings_file}'")
+            if "action" in changed:
+                self.actions, updated = self.actions.updated(changed["action"])
+                if updated:
+                    print(f"成功：已重新載入 '{self.custom_action_file}'（{len(self.actions)} 個動作）")
+            if "character" in changed:
+                self.characters, updated = self.characters.with_custom(changed["character"], self.preview_store.names())
+                if updated:
+                    #搜尋索引以目錄位置編號，人物變動時重建；選單選項的快取一併清除
+                    with self.search_lock:
+                        self.search_index = None
+                    self.autocomplete_cache.clear()
+                    if self.autocomplete_enabled:
+                        self.search_characters("", 1)
+                    print(f"成功：已重新載入 '{self.custom_character_file}'（{len(self.characters)} 個人物）")
+            return changed
+
+    def catalog_choices(self):
+        """人物、中文人物、滑桿、動作選單以目前目錄更新的 gr.update"""
+        names, zh_names = self.autocomplete_choices("")
+        return [
+            gr.update(choices=names),
+            gr.update(choices=zh_names),
+            gr.update(maximum=max(1, len(self.characters) - 1)),
+            gr.update(choices=self.actions.names)
+        ]
+
+    def reload_choices(self):
+        """「重新載入」按鈕：立即檢查自訂設定檔，並以目前的目錄更新人物、動作選單"""
+        self.reload_custom()
+        return self.catalog_choices()
+
+    def fill_choices(self, state=None):
+        """介面先以空選項建立時，工作階段第一次點選選單就填入選項（dispatch 已等待目錄載入完成）"""
+        state = SessionState.ensure(state)
+        if state.choices_loaded:
+            return [gr.update(), gr.update(), gr.update(), gr.update(), state]
+        state.choices_loaded = True
+        return self.catalog_choices() + [state]
+
     def local_request_restart(self):
         "Restart button"
         shared.state.interrupt()
@@ -764,6 +1079,8 @@ class CharacterSelect(scripts.Script):
         if "base64," in base64_str:  # 處理 data URL 格式
             base64_str = base64_str.split("base64,")[1]
     
+        from PIL import Image
+
         image_data = base64.b64decode(base64_str)
         image = Image.open(io.BytesIO(image_data))
         return image
@@ -822,6 +1139,8 @@ class CharacterSelect(scripts.Script):
         Returns:
         tuple: (下載的數據, 儲存路徑)
         """
+        import requests
+
         try:
             # 設定預設 headers
             default_headers = {
@@ -850,3 +1169,20 @@ class CharacterSelect(scripts.Script):
             raise
 
 
+def shutdown_shared_pools():
+    """卸載腳本（重新載入 UI）時關閉共用的執行緒池，重新匯入後的新實例會再建立"""
+    with CharacterSelect.shared_lock:
+        for pool in (CharacterSelect.shared_warmup, CharacterSelect.shared_workers):
+            if pool is not None:
+                pool.shutdown()
+        CharacterSelect.shared_warmup = None
+        CharacterSelect.shared_workers = None
+        CharacterSelect.shared_catalogs.clear()
+
+
+try:
+    from modules import script_callbacks
+
+    script_callbacks.on_script_unloaded(shutdown_shared_pools)
+except ImportError:
+    pass
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+角色提示词查询 - 本地独立服务器
+取代 python -m http.server：提供分页搜索与单张预览图接口，
+静态文件支持 gzip / ETag / Cache-Control，完全离线运行
+
+用法：
+python server.py --port 8888
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+from email.utils import formatdate
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from charselect.cache import LRUCache
+from charselect.catalog import CharacterCatalog
+from charselect.previews import guess_mime, open_preview_store
+from charselect.search import build_character_index
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 可压缩的文件类型
+COMPRESSIBLE = ("text/", "application/json", "application/javascript", "image/svg+xml")
+# 太小的内容不压缩
+MIN_GZIP_SIZE = 1024
+MAX_PAGE_SIZE = 200
+# 有搜索词时最多返回的结果数
+MAX_SEARCH_RESULTS = 1000
+# 只提供网页用到的文件：custom_settings.json（含 api_key）、ai_cache.sqlite3 等其他文件一律不提供
+STATIC_FILES = {'index.html', 'zh_TW.json', 'zh_CN.json'} | {f'output_{i}.json' for i in range(1, 11)}
+STATIC_DIRS = ('web', 'data')
+
+
+def load_json(path, default=None):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+class CharacterService:
+    """角色目录、预览图与搜索索引，与插件共用 charselect 模块"""
+
+    def __init__(self, root):
+        self.root = root
+        self.store = open_preview_store(root)
+        zh_tw = load_json(os.path.join(root, 'zh_TW.json'), {})
+        zh_cn = load_json(os.path.join(root, 'zh_CN.json'), {})
+        custom = load_json(os.path.join(root, 'custom_character.json'), {})
+        self.catalog = CharacterCatalog(custom, self.store.names(), zh_tw)
+        self.index = build_character_index(self.catalog, [zh_cn])
+        # 各语言：提示词 → 中文名称
+        self.names = {
+            'zh_TW': {prompt: name for name, prompt in zh_tw.items()},
+            'zh_CN': {prompt: name for name, prompt in zh_cn.items()},
+        }
+        # 不带搜索词时按中文名称排序列出所有有翻译的角色
+        self.listing = {
+            lang: sorted(names.items(), key=lambda item: item[1])
+            for lang, names in self.names.items()
+        }
+
+    def entry(self, prompt, lang):
+        return {
+            'name': self.names[lang].get(prompt, prompt),
+            'prompt': prompt,
+            'preview': 'api/preview?name=' + quote(prompt, safe='') if prompt in self.store else None,
+        }
+
+    def search(self, query, lang, page, size):
+        if query:
+            prompts = [self.catalog.prompt(name) for name, _ in self.index.search(query, MAX_SEARCH_RESULTS)]
+            prompts = [prompt for prompt in prompts if prompt]
+        else:
+            prompts = [prompt for prompt, _ in self.listing[lang]]
+        start = (page - 1) * size
+        return {
+            'query': query,
+            'page': page,
+            'size': size,
+            'total': len(prompts),
+            'results': [self.entry(prompt, lang) for prompt in prompts[start:start + size]],
+        }
+
+    def info(self):
+        return {'characters': len(self.catalog) - 1, 'previews': len(self.store), 'languages': list(self.names)}
+
+
+def make_etag(data):
+    return '"' + hashlib.sha1(data).hexdigest()[:20] + '"'
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server_version = 'CharacterSelect/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    # 由 make_server 设置
+    service = None
+    root = ROOT
+    static_cache = None
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_HEAD(self):
+        self.do_GET(head_only=True)
+
+    def do_GET(self, head_only=False):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        path = unquote(url.path)
+        try:
+            if path == '/api/info':
+                self.send_json(self.service.info(), head_only)
+            elif path == '/api/search':
+                self.handle_search(params, head_only)
+            elif path == '/api/preview':
+                self.handle_preview(params, head_only)
+            else:
+                self.handle_static(path, head_only)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    # ---------- 接口 ----------
+
+    def handle_search(self, params, head_only):
+        query = params.get('q', [''])[0].strip()
+        lang = params.get('lang', ['zh_CN'])[0]
+        if lang not in self.service.names:
+            lang = 'zh_CN'
+        try:
+            page = max(1, int(params.get('page', ['1'])[0]))
+            size = min(MAX_PAGE_SIZE, max(1, int(params.get('size', ['50'])[0])))
+        except ValueError:
+            self.send_error(HTTPStatus.BAD_REQUEST, explain='page/size 必须是整数')
+            return
+        self.send_json(self.service.search(query, lang, page, size), head_only, cache='no-cache')
+
+    def handle_preview(self, params, head_only):
+        name = params.get('name', [''])[0]
+        data = self.service.store.get_bytes(name)
+        if data is None:
+            self.send_error(HTTPStatus.NOT_FOUND, explain='找不到预览图')
+            return
+        data = bytes(data)
+        # 预览图已是压缩格式，不再 gzip
+        self.send_body(data, guess_mime(data), make_etag(data), 'public, max-age=86400', head_only, compress=False)
+
+    # ---------- 静态文件 ----------
+
+    def translate_path(self, path):
+        parts = [part for part in posixpath.normpath(path).split('/') if part and part not in ('.', '..')]
+        # 不提供隐藏文件（.git 等）
+        if any(part.startswith('.') for part in parts):
+            return None
+        if not parts:
+            parts = ['index.html']
+        if len(parts) == 1:
+            if parts[0] not in STATIC_FILES:
+                return None
+        elif parts[0] not in STATIC_DIRS:
+            return None
+        return os.path.join(self.root, *parts)
+
+    def handle_static(self, path, head_only):
+        full = self.translate_path(path)
+        if full is None or not os.path.isfile(full):
+            self.send_error(HTTPStatus.NOT_FOUND, explain='文件不存在')
+            return
+        st = os.stat(full)
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        ctype = mimetypes.guess_type(full)[0] or 'application/octet-stream'
+        if ctype.startswith('text/') or ctype in ('application/json', 'application/javascript'):
+            ctype += '; charset=utf-8'
+        if self.not_modified(etag):
+            return
+        key = (full, st.st_mtime_ns)
+        data = self.static_cache.get(key)
+        if data is None:
+            with open(full, 'rb') as f:
+                data = f.read()
+            self.static_cache.put(key, data, len(data))
+        self.send_body(data, ctype, etag, 'no-cache', head_only, last_modified=st.st_mtime)
+
+    # ---------- 输出 ----------
+
+    def not_modified(self, etag):
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return True
+        return False
+
+    def send_json(self, obj, head_only, cache='no-cache'):
+        data = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+        self.send_body(data, 'application/json; charset=utf-8', make_etag(data), cache, head_only)
+
+    def send_body(self, data, ctype, etag, cache, head_only, compress=True, last_modified=None):
+        if self.not_modified(etag):
+            return
+        encoding = None
+        if (compress and len(data) >= MIN_GZIP_SIZE and ctype.startswith(COMPRESSIBLE)
+                and 'gzip' in self.headers.get('Accept-Encoding', '')):
+            key = ('gzip', etag)
+            compressed = self.static_cache.get(key)
+            if compressed is None:
+                compressed = gzip.compress(data, compresslevel=6)
+                self.static_cache.put(key, compressed, len(compressed))
+            data = compressed
+            encoding = 'gzip'
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', cache)
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if last_modified is not None:
+            self.send_header('Last-Modified', formatdate(last_modified, usegmt=True))
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(data)
+
+
+def make_server(host, port, root=ROOT, verbose=False, cache_mb=64):
+    service = CharacterService(root)
+    handler = type('Handler', (RequestHandler,), {
+        'service': service,
+        'root': root,
+        'static_cache': LRUCache(max_entries=512, max_bytes=cache_mb * 1024 * 1024),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    server.service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='角色提示词查询 - 本地服务器')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址，局域网访问时用 0.0.0.0')
+    parser.add_argument('--port', type=int, default=8888, help='端口')
+    parser.add_argument('--root', default=ROOT, help='数据与网页所在目录')
+    parser.add_argument('--cache-mb', type=int, default=64, help='内存缓存上限（MB）')
+    parser.add_argument('--verbose', action='store_true', help='输出每个请求的日志')
+    args = parser.parse_args()
+
+    print('🚀 正在加载角色数据...')
+    server = make_server(args.host, args.port, args.root, args.verbose, args.cache_mb)
+    info = server.service.info()
+    print(f"✅ 已加载 {info['characters']} 个角色，{info['previews']} 张预览图")
+    print(f'🌐 服务地址: http://localhost:{args.port}/')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('👋 已停止')
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
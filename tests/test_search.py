@@ -0,0 +1,36 @@
+"""人物搜尋的拼音與拼音縮寫比對（需安裝 pypinyin）"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("pypinyin")
+
+from charselect.catalog import CharacterCatalog
+from charselect.search import build_character_index, pinyin_aliases
+
+
+@pytest.fixture(scope="module")
+def index():
+    catalog = CharacterCatalog(
+        {"random": ""},
+        ["hatsune miku, vocaloid", "kamio misuzu, air", "alice (alice in wonderland), alice in wonderland"],
+        {"初音未來 (VOCALOID)": "hatsune miku, vocaloid", "神尾觀鈴 (AIR)": "kamio misuzu, air"},
+    )
+    return build_character_index(catalog)
+
+
+def test_pinyin_aliases_skip_series():
+    assert pinyin_aliases("初音未來 (VOCALOID)") == ["chuyinweilai", "cywl"]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("cywl", "hatsune miku, vocaloid"),
+    ("chuyin", "hatsune miku, vocaloid"),
+    ("swgl", "kamio misuzu, air"),
+    ("shenwei", "kamio misuzu, air"),
+])
+def test_search_by_pinyin(index, query, expected):
+    assert index.search(query, 1)[0][0] == expected
@@ -1,28 +1,160 @@
 class CharacterSearch {
     constructor() {
         this.zhTWData = {};
-        this.outputData = [];
+        // 提示词 → 预览图（data URL 或文件路径）
+        this.imageIndex = new Map();
         this.currentCharacter = null;
+        this.currentResults = [];
         this.debounceTimer = null;
+        // 服务器模式（server.py）：按需分页获取搜索结果与预览图
+        this.apiMode = false;
+        this.apiLang = 'zh_CN';
+        this.pageSize = 100;
+        this.currentQuery = '';
+        this.currentPage = 1;
+        this.requestSeq = 0;
+        // 静态构建模式（build_site.py）：角色列表与搜索索引，预览图按需加载
+        this.staticMode = false;
+        this.staticEntries = [];
+        this.staticNames = [];
+        this.searchIndex = null;
         this.init();
     }
 
     async init() {
+        this.apiMode = await this.detectApi();
+        if (this.apiMode) {
+            this.bindEvents();
+            await this.loadPage('', 1);
+            return;
+        }
+        if (await this.loadStaticData()) {
+            this.bindEvents();
+            this.displayAllCharacters();
+            return;
+        }
         await this.loadData();
         this.bindEvents();
         // 数据加载完成后立即显示所有角色
         this.displayAllCharacters();
     }
 
+    isTraditionalChinese() {
+        const userLanguage = navigator.language || navigator.userLanguage;
+        return userLanguage === 'zh-TW' || userLanguage === 'zh-HK' || userLanguage === 'zh-MO';
+    }
+
+    // 检测是否由 server.py 提供服务
+    async detectApi() {
+        try {
+            const response = await fetch('./api/info', { cache: 'no-cache' });
+            if (!response.ok) {
+                return false;
+            }
+            const info = await response.json();
+            this.apiLang = this.isTraditionalChinese() ? 'zh_TW' : 'zh_CN';
+            console.log(`服务器模式: ${info.characters} 个角色`);
+            return true;
+        } catch (error) {
+            return false;
+        }
+    }
+
+    // 服务器模式：获取一页结果，append 为 true 时接在现有结果之后
+    async loadPage(query, page, append = false) {
+        const seq = ++this.requestSeq;
+        try {
+            const params = new URLSearchParams({ q: query, page: page, size: this.pageSize, lang: this.apiLang });
+            const response = await fetch(`./api/search?${params}`);
+            const data = await response.json();
+            // 只显示最后一次请求的结果
+            if (seq !== this.requestSeq) {
+                return;
+            }
+            this.currentQuery = query;
+            this.currentPage = page;
+            const results = data.results.map(item => ({
+                chineseName: item.name,
+                englishPrompt: item.prompt,
+                image: item.preview
+            }));
+            const hasMore = page * data.size < data.total;
+            this.displayResults(append ? this.currentResults.concat(results) : results, query, hasMore);
+        } catch (error) {
+            console.error('搜索失败:', error);
+            this.showError('搜索失败，请检查服务器是否运行');
+        }
+    }
+
+    async loadStaticData() {
+        try {
+            const response = await fetch('./data/catalog.json');
+            if (!response.ok) {
+                return false;
+            }
+            const catalog = await response.json();
+            const useTraditional = this.isTraditionalChinese();
+            this.zhTWData = {};
+            this.staticEntries = catalog.entries;
+            this.staticNames = catalog.entries.map(([prompt, twName, cnName]) => {
+                const name = (useTraditional ? twName : cnName) || twName || cnName || prompt;
+                this.zhTWData[name] = prompt;
+                return name;
+            });
+            for (const [prompt, file] of Object.entries(catalog.previews)) {
+                this.imageIndex.set(prompt, `./previews/${file}`);
+            }
+            this.staticMode = true;
+            this.showLoadingStatus();
+            console.log(`静态模式: ${this.staticEntries.length} 个角色`);
+
+            // 搜索索引不阻塞首屏，加载完成前使用简单的字符串匹配
+            fetch('./data/search.json')
+                .then(r => r.json())
+                .then(index => { this.searchIndex = index; })
+                .catch(error => console.warn('无法加载搜索索引:', error));
+            return true;
+        } catch (error) {
+            return false;
+        }
+    }
+
+    // 与 charselect/search.py 的 normalize 一致：统一全半角、转小写、标点改为空格
+    normalize(text) {
+        return text.normalize('NFKC').toLowerCase().replace(/[^\p{L}\p{N}\p{M}]+/gu, ' ').trim();
+    }
+
+    // 使用预建索引搜索：前缀命中的结果排在前面，其余按子字符串匹配
+    performIndexedSearch(query) {
+        const normalized = this.normalize(query);
+        if (!normalized) {
+            return [];
+        }
+        const ranked = this.searchIndex.prefixes[normalized] || [];
+        const seen = new Set(ranked);
+        const docs = ranked.slice();
+        this.searchIndex.texts.forEach((text, doc) => {
+            if (!seen.has(doc) && text.includes(normalized)) {
+                docs.push(doc);
+            }
+        });
+        return docs.map(doc => {
+            const prompt = this.staticEntries[doc][0];
+            return {
+                chineseName: this.staticNames[doc],
+                englishPrompt: prompt,
+                image: this.findImageForCharacter(prompt)
+            };
+        });
+    }
+
     // 修改第22-25行的文件路径
     async loadData() {
         try {
             // 根据系统语言选择加载的文件，默认zh_CN.json
-            const userLanguage = navigator.language || navigator.userLanguage;
-            const isTraditionalChinese = userLanguage === 'zh-TW' || userLanguage === 'zh-HK' || userLanguage === 'zh-MO';
-            const dataFile = isTraditionalChinese ? './zh_TW.json' : './zh_CN.json';
+            const dataFile = this.isTraditionalChinese() ? './zh_TW.json' : './zh_CN.json';
             
-            console.log(`检测到系统语言: ${userLanguage}, 加载文件: ${dataFile}`);
+            console.log(`加载文件: ${dataFile}`);
             
             // 立即加载中文翻译数据
             const zhResponse = await fetch(dataFile);
@@ -58,7 +190,11 @@ class CharacterSearch {
         try {
             const response = await fetch(`./output_${index}.json`);
             const data = await response.json();
-            this.outputData = this.outputData.concat(data);
+            for (const item of data) {
+                for (const [prompt, image] of Object.entries(item)) {
+                    this.imageIndex.set(prompt, image);
+                }
+            }
         } catch (error) {
             console.warn(`无法加载output_${index}.json:`, error);
         }
@@ -114,6 +250,10 @@ class CharacterSearch {
     }
 
     searchCharacters(query) {
+        if (this.apiMode) {
+            this.loadPage(query.trim(), 1);
+            return;
+        }
         if (!query.trim()) {
             // 搜索栏为空时显示所有角色
             this.displayAllCharacters();
@@ -126,6 +266,10 @@ class CharacterSearch {
 
     // 新增方法：显示所有角色
     displayAllCharacters() {
+        if (this.apiMode) {
+            this.loadPage('', 1);
+            return;
+        }
         const results = [];
         
         for (const [chineseName, englishPrompt] of Object.entries(this.zhTWData)) {
@@ -143,6 +287,9 @@ class CharacterSearch {
     }
 
     performSearch(query) {
+        if (this.searchIndex) {
+            return this.performIndexedSearch(query);
+        }
         const results = [];
         const lowercaseQuery = query.toLowerCase();
 
@@ -162,16 +309,12 @@ class CharacterSearch {
     }
 
     findImageForCharacter(englishPrompt) {
-        for (const item of this.outputData) {
-            if (item[englishPrompt]) {
-                return item[englishPrompt];
-            }
-        }
-        return null;
+        return this.imageIndex.get(englishPrompt) || null;
     }
 
-    displayResults(results, query) {
+    displayResults(results, query, hasMore = false) {
         const container = document.getElementById('resultsContainer');
+        this.currentResults = results;
         
         if (results.length === 0) {
             container.innerHTML = `
@@ -188,13 +331,23 @@ class CharacterSearch {
                 <div class="character-name">${query ? this.highlightMatch(result.chineseName, query) : result.chineseName}</div>
                 <div class="character-prompt">${result.englishPrompt}</div>
             </div>
-        `).join('');
+        `).join('') + (hasMore ? `
+            <button class="btn btn-outline-primary w-100 load-more">加载更多</button>
+        ` : '');
 
         container.querySelectorAll('.character-item').forEach(item => {
             item.addEventListener('click', (e) => {
                 this.selectCharacter(e.currentTarget);
             });
         });
+
+        const loadMore = container.querySelector('.load-more');
+        if (loadMore) {
+            loadMore.addEventListener('click', () => {
+                loadMore.disabled = true;
+                this.loadPage(this.currentQuery, this.currentPage + 1, true);
+            });
+        }
     }
 
     selectCharacter(element) {
@@ -203,10 +356,10 @@ class CharacterSearch {
         });
 
         element.classList.add('active');
-        const characterName = element.dataset.character;
+        const result = this.currentResults[Number(element.dataset.index)];
         
         // 获取英文提示词并复制到剪贴板
-        const englishPrompt = this.zhTWData[characterName];
+        const englishPrompt = result.englishPrompt;
         if (englishPrompt) {
             navigator.clipboard.writeText(englishPrompt)
                 .then(() => {
@@ -220,7 +373,7 @@ class CharacterSearch {
                 });
         }
         
-        this.displayCharacter(characterName);
+        this.displayImage(result);
     }
 
     showCopySuccess(text) {
@@ -288,6 +441,7 @@ class CharacterSearch {
             <div class="fade-in">
                 <img src="${characterData.image}" 
                      alt="${characterData.chineseName}" 
+                     loading="lazy" decoding="async"
                      class="img-fluid">
             </div>
         `;